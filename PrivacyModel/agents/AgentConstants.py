@@ -1,6 +1,6 @@
 # File for storing all the constants of the simulation needed for agents
 
-import pandas as pd
+import numpy as np
 
 # PLACES
 BEACH = 0
@@ -26,7 +26,7 @@ places_dict = {
     'TYPHOON': [1.5, 0, 0.5, 2],
     'SPEED_TICKET': [-1.5, -2, 1.5, 2]
 }
-places = pd.DataFrame(data=places_dict, index=['pleasure', 'recognition', 'privacy', 'security'])
+ATTRIBUTES = ['pleasure', 'recognition', 'privacy', 'security']
 
 
 # Since in the model, each place has a cord and in the df its all in string, need a function to map a cord to a
@@ -64,9 +64,40 @@ actions_dict = {
     'SHARE_FRIENDS': [1.5, 1, 0.5, 1],
     'SHARE_PUBLIC': [1.5, 2, 0, 0],
 }
-actions = pd.DataFrame(data=actions_dict, index=['pleasure', 'recognition', 'privacy', 'security'])
 
 # PRIVACY TYPES
 CAUTIOUS = 0
 CONSCIENTIOUS = 1
 CASUAL = 2
+
+
+# Storing the preference weights of each privacy type
+# format- [pleasure, recognition, privacy, security], indexed by privacy type
+preferences = np.array([[0.1, 0.2, 1, 0.7],
+                        [0.4, 0.6, 0.5, 0.6],
+                        [1, 0.7, 0, 0.3]])
+
+
+# Computes the value of every action at every place for every privacy type, as a (privacy type x place x action) table.
+# Each entry is sum(action_attribute * place_attribute * preference) over pleasure, recognition, privacy and security,
+# so agents only need to look up their row instead of recomputing it at each step
+def build_action_values(weights):
+    weights = np.asarray(weights, dtype=float)
+    # (privacy type, place, attribute) * (action, attribute) -> (privacy type, place, action, attribute)
+    weighted_places = weights[:, np.newaxis, :] * np.array(list(places_dict.values()))[np.newaxis, :, :]
+    return (weighted_places[:, :, np.newaxis, :] * np.array(list(actions_dict.values()))[np.newaxis, np.newaxis, :, :]
+            ).sum(axis=-1)
+
+
+action_values = build_action_values(preferences)
+
+
+# The places and actions tables as (attribute x place/action) DataFrames, only made (and pandas imported) when asked for
+def __getattr__(name):
+    if name in ('places', 'actions'):
+        import pandas as pd
+
+        table = pd.DataFrame(data=places_dict if name == 'places' else actions_dict, index=ATTRIBUTES)
+        globals()[name] = table
+        return table
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
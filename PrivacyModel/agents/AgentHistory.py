@@ -0,0 +1,111 @@
+# Columnar store for an agent's past interactions, used by EpsilonAgent to learn from rewards.
+# Every column is a NumPy array that doubles in size when full, so appending a time-step is amortized O(1), and the
+# companions of each time-step are stored CSR-style: the companions of row i are othersIDs[othersOffsets[i]:
+# othersOffsets[i + 1]]
+#
+# The rewards of each action are also kept in time order, and the sum and count of the rewards of each action taken with
+# each companion are kept up to date as rows are appended, so the action-value estimates EpsilonAgent needs can be read
+# without going back through the rows
+
+from functools import reduce
+from operator import add
+
+import numpy as np
+
+
+class AgentHistory:
+    """Growable history of (timeStep, othersID, place, action, reward, happiness) rows for one agent."""
+
+    def __init__(self, agent_id, capacity=16):
+        self.agentID = agent_id
+        self.length = 0
+        self.timeStep = np.empty(capacity, dtype=np.int64)
+        self.place = np.empty(capacity, dtype=np.int64)
+        self.action = np.empty(capacity, dtype=np.int64)
+        self.reward = np.empty(capacity, dtype=np.float64)
+        self.happiness = np.empty(capacity, dtype=np.float64)
+        self.othersOffsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.othersIDs = np.empty(capacity, dtype=np.int64)
+        # Rewards of the rows of each action ([SHARE_NO, SHARE_FRIENDS, SHARE_PUBLIC]), in time order
+        self.actionRewardLists = ([], [], [])
+        # companion ID -> [SHARE_NO, SHARE_FRIENDS, SHARE_PUBLIC] reward sums and counts
+        self.rewardSums = {}
+        self.actionCounts = {}
+
+    def __len__(self):
+        return self.length
+
+    def append(self, time_step, others_id, place, action, reward, happiness):
+        row = self.length
+        if row == len(self.timeStep):
+            self.growRows()
+        start = self.othersOffsets[row]
+        end = start + len(others_id)
+        if end > len(self.othersIDs):
+            self.othersIDs = grow(self.othersIDs, end)
+
+        self.timeStep[row] = time_step
+        self.place[row] = place[0]
+        self.action[row] = action
+        self.reward[row] = reward
+        self.happiness[row] = happiness
+        self.othersIDs[start:end] = others_id
+        self.othersOffsets[row + 1] = end
+        self.length = row + 1
+
+        self.actionRewardLists[action].append(reward)
+        for others in others_id:
+            if others not in self.rewardSums:
+                self.rewardSums[others] = [0, 0, 0]
+                self.actionCounts[others] = [0, 0, 0]
+            self.rewardSums[others][action] += reward
+            self.actionCounts[others][action] += 1
+
+    def growRows(self):
+        self.timeStep = grow(self.timeStep)
+        self.place = grow(self.place)
+        self.action = grow(self.action)
+        self.reward = grow(self.reward)
+        self.happiness = grow(self.happiness)
+        self.othersOffsets = grow(self.othersOffsets)
+
+    # Companions the agent was with at a given row
+    def others(self, row):
+        return self.othersIDs[self.othersOffsets[row]:self.othersOffsets[row + 1]]
+
+    def hasInteracted(self, others_id):
+        return others_id in self.actionCounts
+
+    # Reward sums and counts of each action taken with a companion, as ([no, friends, public], [no, friends, public]),
+    # every row with the companion counted once (for snapshot_history, see EpsilonAgent.epsilon)
+    def actionRewards(self, others_id):
+        if others_id not in self.actionCounts:
+            return [0, 0, 0], [0, 0, 0]
+        return self.rewardSums[others_id], self.actionCounts[others_id]
+
+    # Reward sums and counts of each action over every row, each row counted repeat times: the rows are added up in time
+    # order, repeat times over, as the original pandas history did when every row held the current companions
+    def repeatedRewards(self, repeat):
+        return ([reduce(add, rewards * repeat, 0) for rewards in self.actionRewardLists],
+                [len(rewards) * repeat for rewards in self.actionRewardLists])
+
+    # Same layout as the old pandas history, for debugging
+    def toDataFrame(self):
+        import pandas as pd
+
+        n = self.length
+        return pd.DataFrame(data={'timeStep': self.timeStep[:n],
+                                  'agentID': self.agentID,
+                                  'othersID': [self.others(i).tolist() for i in range(n)],
+                                  'place': [(x, 0) for x in self.place[:n].tolist()],
+                                  'action': self.action[:n],
+                                  'reward': self.reward[:n],
+                                  'happiness': self.happiness[:n]},
+                            columns=['timeStep', 'agentID', 'othersID', 'place', 'action', 'reward', 'happiness'])
+
+
+# Returns a copy of array with at least double the capacity (and at least min_size), keeping its contents
+def grow(array, min_size=0):
+    new_array = np.empty(max(2 * len(array), min_size, 1), dtype=array.dtype)
+    new_array[:len(array)] = array
+    return new_array
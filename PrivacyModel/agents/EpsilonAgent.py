@@ -1,112 +1,26 @@
 # More sophisticated version of agents where they learn to maximise reward using epsilon-greedy algorithm
 
-from mesa import Agent
-import pandas as pd
-
 from . import AgentConstants
+from .AgentHistory import AgentHistory
+from .PrivacyAgent import PrivacyAgent
 
-NUM_OF_AGENTS = 20
 
+class EpsilonAgent(PrivacyAgent):
+    __slots__ = ('history',)
 
-class EpsilonAgent(Agent):
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
-        if self.model.privacyPopulation == -1:
-            p = self.random.uniform(0, 1)
-            if p <= 0.455:
-                self.privacyType = AgentConstants.CAUTIOUS
-                self.pleasure = 0.1
-                self.recognition = 0.2
-                self.privacy = 1
-                self.security = 0.7
-            elif p <= 0.818:
-                self.privacyType = AgentConstants.CONSCIENTIOUS
-                self.pleasure = 0.4
-                self.recognition = 0.6
-                self.privacy = 0.5
-                self.security = 0.6
-            else:
-                self.privacyType = AgentConstants.CASUAL
-                self.pleasure = 1
-                self.recognition = 0.7
-                self.privacy = 0
-                self.security = 0.3
-        elif self.model.privacyPopulation == 0:
-            self.privacyType = AgentConstants.CAUTIOUS
-            self.pleasure = 0.1
-            self.recognition = 0.2
-            self.privacy = 1
-            self.security = 0.7
-        elif self.model.privacyPopulation == 1:
-            self.privacyType = AgentConstants.CONSCIENTIOUS
-            self.pleasure = 0.4
-            self.recognition = 0.6
-            self.privacy = 0.5
-            self.security = 0.6
-        elif self.model.privacyPopulation == 2:
-            self.privacyType = AgentConstants.CASUAL
-            self.pleasure = 1
-            self.recognition = 0.7
-            self.privacy = 0
-            self.security = 0.3
-        self.happy = 0
-        self.currentAction = AgentConstants.SHARE_NO
-        self.friends = self.model.relationship.adj[unique_id]
-        self.currentCompanions = []
         # History dictionary for initialising the structure for each agent,
         # used later for agents to learn from rewards.
-        self.history = pd.DataFrame(columns=['timeStep', 'agentID', 'othersID', 'place',
-                                             'action', 'reward', 'happiness'])
-        self.reward = 0
-
-    def step(self):
-        self.decision()
-        self.move()
-
-    # Function for mobility pattern modeling
-
-    def move(self):
-        x = self.pos
-
-        # Might need y later
-        newY = 0
-
-        p = self.random.uniform(0, 1)
-        # Chance of each place is uniform
-        if p <= (1 / 9):
-            newX = AgentConstants.BEACH
-        elif p <= (2 / 9):
-            newX = AgentConstants.MUSEUM
-        elif p <= (3 / 9):
-            newX = AgentConstants.COMPANY
-        elif p <= (4 / 9):
-            newX = AgentConstants.SURGERY
-        elif p <= (5 / 9):
-            newX = AgentConstants.EXAM
-        elif p <= (6 / 9):
-            newX = AgentConstants.COMPETITION
-        elif p <= (7 / 9):
-            newX = AgentConstants.FUNERAL
-        elif p <= (8 / 9):
-            newX = AgentConstants.TYPHOON
-        else:
-            newX = AgentConstants.SPEED_TICKET
-        self.model.grid.move_agent(self, (newX, newY))
+        self.history = AgentHistory(unique_id)
 
     # Function for the decision making process of the agent
     # At each given location, the agent decides whether or not it wants to share a photo with the public,
     # common friends, or no one.
     def decision(self):
-        location = self.pos
-        str_location = AgentConstants.map_cords_to_places(location)
-
-        actions_values = self.processLocation(str_location)
-
         # Determine which action to take
-        # Basic version: add up all the values in each row, and see which one is largest
-        no_value = (actions_values.loc[:, 'SHARE_NO']).sum()
-        friends_value = (actions_values.loc[:, 'SHARE_FRIENDS']).sum()
-        public_value = (actions_values.loc[:, 'SHARE_PUBLIC']).sum()
+        # Basic version: the value of each action is the sum of its weighted attributes, see which one is largest
+        no_value, friends_value, public_value = self.processLocation(self.pos)
 
         selfish_action = max(no_value,
                              friends_value,
@@ -115,8 +29,7 @@ class EpsilonAgent(Agent):
         # Set an intermediate currentAction for other agents to see what action you've chosen
         self.changeCurrentAction(no_value, friends_value, public_value, selfish_action)
 
-        agent_happiness = [agent.happy for agent in self.model.schedule.agents]
-        average_happiness = sum(agent_happiness) / NUM_OF_AGENTS
+        average_happiness = self.model.populationStats.mean
 
         current_companions, unhappy_companions = self.updateCompanions(average_happiness)
 
@@ -165,91 +78,32 @@ class EpsilonAgent(Agent):
         elif action == public_value:
             self.currentAction = AgentConstants.SHARE_PUBLIC
 
-    # Function for agents to evaluate their preferences in a given location, returns an array of with attributes of
-    # each actions
-    def processLocation(self, location):
-        attributes = AgentConstants.places.loc[:, location]
-
-        # Calculate the new values with places_attribute * agent_attribute, then return all of it as an array
-        preferences = pd.Series(data=[self.pleasure, self.recognition, self.privacy, self.security],
-                                index=AgentConstants.places.index)
-        new_preferences = pd.Series(data=(preferences.values * attributes.values), index=AgentConstants.places.index)
-
-        # Compute the values of each action, action_values * new_preference.values
-        # Format:
-        #               SHARE_NO  SHARE_FRIENDS SHARE_PUBLIC
-        # pleasure          x          x             x
-        # recognition       x          x             x
-        # privacy           x          x             x
-        # security          x          x             x
-        no_values = AgentConstants.actions.loc[:, 'SHARE_NO']
-        friend_values = AgentConstants.actions.loc[:, 'SHARE_FRIENDS']
-        public_values = AgentConstants.actions.loc[:, 'SHARE_PUBLIC']
-        actions_values = pd.DataFrame(data={'SHARE_NO': (no_values * new_preferences.values),
-                                            'SHARE_FRIENDS': (friend_values * new_preferences.values),
-                                            'SHARE_PUBLIC': (public_values * new_preferences.values)},
-                                      index=AgentConstants.actions.index, columns=AgentConstants.actions.columns)
-        return actions_values
-
-    # Function for getting the agent's current companions, and updating that list for later use
+    # Function for getting the agent's current companions, and updating that list for later use, also returns the ids of
+    # the companions that are below the average happiness
     def updateCompanions(self, average_happiness):
-        self.currentCompanions.clear()
-
-        # Get all agents that are friends and in the same location with the user
-        current_companions = [agent for agent in self.model.schedule.agents
-                              if agent.unique_id in self.friends and agent.pos == self.pos]
+        current_companions = super().updateCompanions()
 
         # Get all companions that are 'unhappy' (below the average happiness) for Rawls check
         unhappy_companions = [agent.unique_id for agent in current_companions if agent.happy < average_happiness]
 
-        for k in current_companions:
-            self.currentCompanions.append(k.unique_id)
-
         return current_companions, unhappy_companions
 
-    # Function for checking if anyone in the agent's social circle is in the same location, alter the values for actions
-    # based on companion's preferences if necessary
-    def processCompanions(self, action, current_companions):
-        reward = 0
-
-        # Look through other companion's preferences, then tweak values for actions accordingly
-        for i in current_companions:
-            if i.currentAction == self.currentAction:
-                reward += 5
-            elif i.currentAction != self.currentAction:
-                reward -= 2
-
-        if reward != 0:
-            reward = (reward * 2) / len(current_companions)
-
-        action += reward
-
-        return action, reward
-
     # Function for adding everything that happened in this time-step into the history dictionary
     def appendHistory(self, reward):
-        self.history = self.history.append({'timeStep': self.model.timeStep, 'agentID': self.unique_id,
-                                            'othersID': self.currentCompanions, 'place': self.pos,
-                                            'action': self.currentAction,
-                                            'reward': reward, 'happiness': self.happy}, ignore_index=True)
+        self.history.append(self.model.timeStep, self.currentCompanions, self.pos, self.currentAction,
+                            reward, self.happy)
 
     # Function for agents to look into past interactions with other agents to maximise reward
     def epsilon(self, average_happiness, unhappy_companions):
 
-        # Create a temp dataframe for easier accessing
-        query_history = pd.DataFrame(columns=['timeStep', 'agentID', 'othersID', 'place',
-                                              'action', 'reward', 'happiness'])
-
-        i = 0
-        # Now lookup past entries of the agent's current companions
-        for query in self.currentCompanions:
-            for row in self.history.iterrows():
-                if query in row[1]['othersID']:
-                    query_history.loc[i] = row[1]
-                    i += 1
-
-        # Break out of this function if there are no past interactions, returns action_choice = 4 to indicate this
-        if query_history.empty:
+        # Break out of this function if there are no past interactions with the agent's current companions,
+        # returns action_choice = 4 to indicate this. Unless the model keeps snapshot_history, every past row counts as
+        # an interaction with every current companion, as in the original model whose history rows all held the same
+        # (current) companions list
+        if self.model.snapshotHistory:
+            if not any(self.history.hasInteracted(query) for query in self.currentCompanions):
+                return 4
+        elif not self.currentCompanions or not len(self.history):
             return 4
 
         interaction_choices = []
@@ -270,28 +124,18 @@ class EpsilonAgent(Agent):
             if self.happy < average_happiness:
                 return 4
             else:
+                # Without snapshot_history every row is counted once for each current companion, the same for every
+                # companion
+                if not self.model.snapshotHistory and unhappy_companions:
+                    repeated_rewards = self.history.repeatedRewards(len(self.currentCompanions))
                 for query in unhappy_companions:
-                    no_weighting = 0
-                    no_count = 0
-                    friends_weighting = 0
-                    friends_count = 0
-                    public_weighting = 0
-                    public_count = 0
-
-                    # Run through the query DF and add the reward value of each action to the weightings
-                    for row in query_history.iterrows():
-                        if query in row[1]['othersID']:
-                            if row[1]['action'] == 0:
-                                no_weighting += row[1]['reward']
-                                no_count += 1
-                            elif row[1]['action'] == 1:
-                                friends_weighting += row[1]['reward']
-                                friends_count += 1
-                            elif row[1]['action'] == 2:
-                                public_weighting += row[1]['reward']
-                                public_count += 1
-                        else:
-                            continue
+                    # Sum and count of the rewards of each action with that companion, kept up to date by the history
+                    if self.model.snapshotHistory:
+                        rewards = self.history.actionRewards(query)
+                    else:
+                        rewards = repeated_rewards
+                    (no_weighting, friends_weighting, public_weighting), (no_count, friends_count, public_count) = \
+                        rewards
 
                     # Calculate the action-value estimates
                     no_estimate = self.safeDivision(no_weighting, no_count)
@@ -311,7 +155,7 @@ class EpsilonAgent(Agent):
         if not interaction_choices:
             return 4
         else:
-            action_choice = self.random.choice(interaction_choices)
+            action_choice = self.model.choice('explore', self.unique_id, interaction_choices)
 
             return action_choice
 
@@ -0,0 +1,154 @@
+# Base of every agent model. It holds what all the policies share: the privacy type, the mobility pattern, location
+# valuation, companions and reward, so a policy only has to override decision().
+#
+# Agents are kept small for runs with millions of them: the attributes are __slots__ instead of a per-instance dict
+# (so it does not subclass mesa's Agent, but has the same unique_id/model/pos/step/random interface the schedule and
+# grid use), and the preference weights are not copied onto every agent but read from the model's table by privacy type
+
+from . import AgentConstants
+
+
+class PrivacyAgent:
+    """An agent of PrivacyModel, subclasses implement decision()."""
+
+    __slots__ = ('unique_id', 'model', 'pos', 'privacyType', 'currentAction', 'currentCompanions', 'reward', '_happy')
+
+    def __init__(self, unique_id, model):
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
+        # Privacy type of the agent, drawn from the spread of the population if privacyPopulation is -1
+        if self.model.privacyPopulation == -1:
+            p = self.model.uniform('privacy', self.unique_id)
+            if p <= 0.455:
+                self.privacyType = AgentConstants.CAUTIOUS
+            elif p <= 0.818:
+                self.privacyType = AgentConstants.CONSCIENTIOUS
+            else:
+                self.privacyType = AgentConstants.CASUAL
+        elif self.model.privacyPopulation in (0, 1, 2):
+            self.privacyType = self.model.privacyPopulation
+        self.happy = 0
+        self.currentAction = AgentConstants.SHARE_NO
+        self.currentCompanions = ()
+        self.reward = 0
+
+    @property
+    def random(self):
+        return self.model.random
+
+    # Ids of the agent's friends in ascending order, a slice of the model's CSR graph rather than a copy per agent
+    @property
+    def friends(self):
+        return self.model.relationship.neighbours(self.unique_id)
+
+    # Preference weights of the agent's privacy type, from the model's (privacy type x attribute) table
+    @property
+    def pleasure(self):
+        return self.model.preferences[self.privacyType][0]
+
+    @property
+    def recognition(self):
+        return self.model.preferences[self.privacyType][1]
+
+    @property
+    def privacy(self):
+        return self.model.preferences[self.privacyType][2]
+
+    @property
+    def security(self):
+        return self.model.preferences[self.privacyType][3]
+
+    # Happiness is mirrored into the model's population statistics every time it changes
+    @property
+    def happy(self):
+        return self._happy
+
+    @happy.setter
+    def happy(self, value):
+        self.model.populationStats.update(self.unique_id, value)
+        self._happy = value
+
+    def step(self):
+        self.decision()
+        self.move()
+
+    def advance(self):
+        pass
+
+    # Function for mobility pattern modeling
+
+    def move(self):
+        x = self.pos
+
+        # Might need y later
+        newY = 0
+
+        p = self.model.uniform('move', self.unique_id)
+        if self.model.mobility is not None:
+            # Chance of each place is given by the model's place distribution
+            self.model.moveAgent(self, (self.model.mobility.place(self.privacyType, p), newY))
+            return
+
+        # Chance of each place is uniform
+        if p <= (1 / 9):
+            newX = AgentConstants.BEACH
+        elif p <= (2 / 9):
+            newX = AgentConstants.MUSEUM
+        elif p <= (3 / 9):
+            newX = AgentConstants.COMPANY
+        elif p <= (4 / 9):
+            newX = AgentConstants.SURGERY
+        elif p <= (5 / 9):
+            newX = AgentConstants.EXAM
+        elif p <= (6 / 9):
+            newX = AgentConstants.COMPETITION
+        elif p <= (7 / 9):
+            newX = AgentConstants.FUNERAL
+        elif p <= (8 / 9):
+            newX = AgentConstants.TYPHOON
+        else:
+            newX = AgentConstants.SPEED_TICKET
+        self.model.moveAgent(self, (newX, newY))
+
+    # Function for the decision making process of the agent
+    # At each given location, the agent decides whether or not it wants to share a photo with the public,
+    # common friends, or no one.
+    def decision(self):
+        raise NotImplementedError
+
+    # Function for agents to evaluate their preferences in a given location, returns the values of each action as
+    # [SHARE_NO, SHARE_FRIENDS, SHARE_PUBLIC]
+    def processLocation(self, location):
+        # Only depends on the privacy type and the place, so it is looked up from the model's precomputed
+        # (privacy type x place x action) table, see AgentConstants.build_action_values
+        return self.model.actionValues[self.privacyType, location[0]].tolist()
+
+    # Function for getting the agent's current companions, and updating their ids (a tuple) for later use
+    def updateCompanions(self):
+        # Get all agents that are friends and in the same location with the user
+        current_companions = self.model.companionsOf(self)
+
+        self.currentCompanions = tuple(k.unique_id for k in current_companions)
+
+        return current_companions
+
+    # Function for checking if anyone in the agent's social circle is in the same location, alter the values for actions
+    # based on companion's preferences if necessary
+    def processCompanions(self, best_action, current_companions):
+
+        reward = 0
+
+        # Look through other companion's preferences, then tweak values for actions accordingly
+        for i in current_companions:
+            if i.currentAction == self.currentAction:
+                reward += 5
+            elif i.currentAction != self.currentAction:
+                reward -= 2
+
+        if reward != 0:
+            reward = (reward * 2) / len(current_companions)
+
+        best_action += reward
+
+        return best_action, reward
@@ -0,0 +1,93 @@
+# One-pass aggregation of replicate results. Replicates are fed in one at a time, from a ReplicateStore, results files
+# or straight from the replication/sweep runners, and the per-(step, metric) count, mean, variance, min and max are
+# updated with Welford's algorithm, so memory stays the same however many replicates there are.
+
+import numpy as np
+
+from storage import METRICS, run_arrays, run_metrics
+
+
+class StreamingAggregate:
+    """Running count, mean, variance, min and max of every (step, metric) over the replicates seen so far.
+
+    Replicates may have different numbers of steps (e.g. when they stopped early), NaN entries are skipped.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self.replicates = 0
+        self.count = np.zeros((0, len(metrics)))
+        self._mean = np.zeros((0, len(metrics)))
+        self._m2 = np.zeros((0, len(metrics)))
+        self.min = np.zeros((0, len(metrics)))
+        self.max = np.zeros((0, len(metrics)))
+
+    @property
+    def steps(self):
+        return len(self.count)
+
+    # Adds a (steps x metrics) replicate
+    def update(self, replicate):
+        replicate = np.asarray(replicate, dtype=np.float64)
+        if replicate.shape[0] > self.steps:
+            self.extend(replicate.shape[0])
+        rows = slice(0, replicate.shape[0])
+
+        valid = ~np.isnan(replicate)
+        count = self.count[rows]
+        mean = self._mean[rows]
+        count += valid
+        delta = np.where(valid, replicate - mean, 0)
+        mean += np.divide(delta, count, out=np.zeros_like(delta), where=valid)
+        self._m2[rows] += np.where(valid, delta * (replicate - mean), 0)
+        np.fmin(self.min[rows], replicate, out=self.min[rows])
+        np.fmax(self.max[rows], replicate, out=self.max[rows])
+        self.replicates += 1
+
+    # Adds a run's results DataFrame (from run_simulation or the runners) as a replicate of METRICS
+    def updateRun(self, modelDF):
+        self.update(run_metrics(run_arrays(modelDF)))
+
+    def extend(self, steps):
+        extra = steps - self.steps
+        self.count = np.concatenate([self.count, np.zeros((extra, len(self.metrics)))])
+        self._mean = np.concatenate([self._mean, np.zeros((extra, len(self.metrics)))])
+        self._m2 = np.concatenate([self._m2, np.zeros((extra, len(self.metrics)))])
+        self.min = np.concatenate([self.min, np.full((extra, len(self.metrics)), np.nan)])
+        self.max = np.concatenate([self.max, np.full((extra, len(self.metrics)), np.nan)])
+
+    # NaN where no replicate has a value
+    @property
+    def mean(self):
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    # Sample variance, NaN where fewer than 2 replicates have a value
+    @property
+    def variance(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self._m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+# Aggregates every replicate of a ReplicateStore, reading one replicate at a time from the memory map
+def aggregate_store(store):
+    aggregate = StreamingAggregate(store.metrics)
+    for replicate in store:
+        aggregate.update(replicate)
+    return aggregate
+
+
+# Consumes the results of a runner as they arrive, e.g. replication.run_all_replications (name, seed, modelDF) or
+# sweep.run_sweep (config, modelDF), keeping one aggregate per group (by default the first item of each result).
+# After every result yields (group, aggregates), so the aggregates can be looked at while runs are still going
+def aggregate_results(results, group=lambda result: result[0]):
+    aggregates = {}
+    for result in results:
+        key = group(result)
+        if key not in aggregates:
+            aggregates[key] = StreamingAggregate()
+        aggregates[key].updateRun(result[-1])
+        yield key, aggregates
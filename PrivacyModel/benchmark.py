@@ -0,0 +1,128 @@
+# Benchmarks of PrivacyModel.step() for every agent model, population size and run length. Each (agent, N) pair is run
+# once for the longest run length, with the time of each window between consecutive run lengths recorded separately,
+# since the learning agent gets slower as its history grows. Results (steps/sec, agent-steps/sec and peak memory) are
+# printed and saved as JSON so runs can be compared over time, e.g.
+#
+#   python benchmark.py --sizes 20 200 2000 --steps 10 50 200
+#   python benchmark.py --compare results/benchmarks/old.json results/benchmarks/new.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from model import PrivacyModel
+from replication import AGENT_MODELS
+from vectorized import POLICIES, VectorizedPrivacyModel
+
+NUM_OF_FRIENDS = 8
+REWIRE = 0.3
+
+
+def build_model(engine, agent, N, seed):
+    if engine == 'vectorized':
+        return VectorizedPrivacyModel(AGENT_MODELS[agent], N, NUM_OF_FRIENDS, REWIRE, seed=seed)
+    return PrivacyModel(AGENT_MODELS[agent], N, NUM_OF_FRIENDS, REWIRE, seed=seed)
+
+
+# Times one (engine, agent, N) run up to the longest run length, returns one result per run length
+def time_run(engine, agent, N, run_lengths, seed=102):
+    start = time.perf_counter()
+    model_inst = build_model(engine, agent, N, seed)
+    build_seconds = time.perf_counter() - start
+
+    results = []
+    elapsed = 0.0
+    done = 0
+    for steps in run_lengths:
+        start = time.perf_counter()
+        for i in range(steps - done):
+            model_inst.step()
+        window = time.perf_counter() - start
+        elapsed += window
+        results.append({'engine': engine, 'agent': agent, 'N': N, 'steps': steps, 'build_seconds': build_seconds,
+                        'seconds': elapsed,
+                        'steps_per_sec': steps / elapsed,
+                        'agent_steps_per_sec': steps * N / elapsed,
+                        # Speed over the last window only, shows how much slower late steps are
+                        'window_steps_per_sec': (steps - done) / window})
+        done = steps
+    return results
+
+
+# Peak traced memory (MB) of building and running the model for steps steps, in a separate run because tracing
+# allocations slows the model down
+def peak_memory(engine, agent, N, steps, seed=102):
+    tracemalloc.start()
+    model_inst = build_model(engine, agent, N, seed)
+    for i in range(steps):
+        model_inst.step()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(agents, sizes, run_lengths, engines=('object',), memory=True):
+    run_lengths = sorted(run_lengths)
+    results = []
+    for engine in engines:
+        for agent in agents:
+            if engine == 'vectorized' and AGENT_MODELS[agent].__name__ not in POLICIES:
+                continue
+            for N in sizes:
+                for result in time_run(engine, agent, N, run_lengths):
+                    if memory:
+                        result['peak_memory_mb'] = peak_memory(engine, agent, N, result['steps'])
+                    print('{engine:10} {agent:8} N={N:<7} steps={steps:<5} {steps_per_sec:10.1f} steps/s '
+                          '{agent_steps_per_sec:12.0f} agent-steps/s'.format(**result) +
+                          ('  {:8.1f} MB'.format(result['peak_memory_mb']) if memory else ''))
+                    results.append(result)
+    return results
+
+
+# Prints the speed-up of every case found in both benchmark files
+def compare(old_path, new_path):
+    with open(old_path) as file:
+        old = {(r['engine'], r['agent'], r['N'], r['steps']): r for r in json.load(file)['results']}
+    with open(new_path) as file:
+        new = json.load(file)['results']
+    for result in new:
+        key = (result['engine'], result['agent'], result['N'], result['steps'])
+        if key in old:
+            print('{:10} {:8} N={:<7} steps={:<5} x{:.2f}'.format(*key, result['steps_per_sec'] /
+                                                                  old[key]['steps_per_sec']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark PrivacyModel.step() across agent models and sizes.')
+    parser.add_argument('--agents', nargs='+', choices=list(AGENT_MODELS), default=list(AGENT_MODELS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[20, 200, 2000, 20000])
+    parser.add_argument('--steps', nargs='+', type=int, default=[10, 50, 200])
+    parser.add_argument('--engines', nargs='+', choices=['object', 'vectorized'], default=['object'])
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    parser.add_argument('--output', default='results/benchmarks')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved benchmark files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        results = run_benchmarks(args.agents, args.sizes, args.steps, args.engines, not args.no_memory)
+        os.makedirs(args.output, exist_ok=True)
+        path = os.path.join(args.output, 'benchmark-' + time.strftime('%Y%m%d-%H%M%S') + '.json')
+        with open(path, 'w') as file:
+            json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(),
+                       'python': platform.python_version(), 'machine': platform.platform(),
+                       'results': results}, file, indent=2)
+        print('saved', path)
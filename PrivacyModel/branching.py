@@ -0,0 +1,106 @@
+# Branching runs: a model is run once up to a chosen step (e.g. the end of EpsilonAgent's 50 exploration steps), then
+# every variant carries on from a copy of it with its own seed, preferences or mobility, so the shared warm-up is only
+# simulated once.
+#
+# On Linux each branch is a process forked from the one holding the warmed-up model, which shares its memory
+# copy-on-write: nothing is copied up front, pages are only duplicated as the branch writes to them. Where fork is not
+# available the model is pickled once (see checkpoint.py) and every branch starts from its own unpickled copy.
+#
+#   branches = branch_simulation(500, EpsilonAgent, branch_at=50, variants=[{'seed': s} for s in range(100)], N=200)
+
+from multiprocessing import get_all_start_methods, get_context
+import pickle
+
+import numpy as np
+
+from agents import AgentConstants
+from mobility import PlaceDistribution, place_distribution
+from model import NUM_OF_AGENTS, PrivacyModel, finish_simulation
+from rng import CounterStreams
+
+# The warmed-up model and its run state in the branch processes, inherited when forked and unpickled otherwise
+_trunk = None
+
+
+# Parameters a branch can change
+BRANCH_PARAMETERS = ('seed', 'preferences', 'mobility')
+
+
+def check_variant(variant):
+    unknown = set(variant) - set(BRANCH_PARAMETERS)
+    if unknown:
+        raise ValueError('Unknown branch parameters: ' + ', '.join(sorted(unknown)))
+
+
+# Changes a model's seed, preferences and/or mobility in place for a branch
+def apply_variant(model, variant):
+    check_variant(variant)
+    if 'seed' in variant:
+        model.seed = variant['seed']
+        model.random.seed(variant['seed'])
+        if hasattr(model, 'rng'):
+            model.rng = np.random.default_rng(variant['seed'])
+        if model.streams is not None:
+            model.streams = CounterStreams(variant['seed'])
+    if 'preferences' in variant:
+        model.preferences = variant['preferences']
+        model.actionValues = AgentConstants.build_action_values(variant['preferences'])
+    if 'mobility' in variant:
+        model.mobility = place_distribution(variant['mobility'])
+        if hasattr(model, 'sampler'):
+            model.sampler = model.mobility if model.mobility is not None else PlaceDistribution.uniform()
+        elif model.mobility is None and model.batchMoves:
+            model.mobility = PlaceDistribution.uniform()
+
+
+def load_trunk(data):
+    global _trunk
+    _trunk = pickle.loads(data)
+
+
+# Runs in the branch process, which only runs this one branch so it can change the trunk's model in place
+def run_branch(variant):
+    model_inst = _trunk['model']
+    apply_variant(model_inst, variant)
+    config = dict(_trunk['config'], branched_at=model_inst.timeStep, variant=variant)
+    return finish_simulation(model_inst, _trunk['steps'], config, _trunk['stop'])
+
+
+# Carries a model on to steps steps once for every variant (a dict of 'seed', 'preferences' and/or 'mobility'), in up
+# to workers processes at a time. Returns the results DataFrame of every branch in the order of variants, each with
+# the whole run from step 0 and the branch's variant and starting step in attrs['config']. An empty variant carries
+# on exactly as the model would have
+def run_branches(model_inst, variants, steps, config=None, stop=None, workers=None, fork=None):
+    global _trunk
+
+    for variant in variants:
+        check_variant(variant)
+    if fork is None:
+        fork = 'fork' in get_all_start_methods()
+    state = {'model': model_inst, 'steps': steps, 'config': config or {}, 'stop': stop}
+    # A process per branch, each forked (or started) afresh, so every branch starts from the untouched trunk
+    if fork:
+        _trunk = state
+        try:
+            with get_context('fork').Pool(workers, maxtasksperchild=1) as pool:
+                return pool.map(run_branch, variants, chunksize=1)
+        finally:
+            _trunk = None
+    with get_context('spawn').Pool(workers, initializer=load_trunk, initargs=(pickle.dumps(state, protocol=5),),
+                                   maxtasksperchild=1) as pool:
+        return pool.map(run_branch, variants, chunksize=1)
+
+
+# Runs a model like run_simulation up to step branch_at, then every variant on from there to steps, see run_branches
+def branch_simulation(steps, agent_model, branch_at, variants, seed=102, N=NUM_OF_AGENTS, num_of_friends=8, rewire=0.3,
+                      privacy_population=2, stop=None, workers=None, fork=None):
+    model_inst = PrivacyModel(agent_model, N, num_of_friends, rewire, seed=seed, privacy_population=privacy_population)
+    config = {'agent': agent_model.__name__, 'N': N, 'num_of_friends': num_of_friends, 'rewire': rewire,
+              'privacy_population': privacy_population, 'seed': seed, 'steps': steps}
+    if stop is not None:
+        stop.reset()
+    finish_simulation(model_inst, branch_at, config, stop)
+    if not model_inst.running:
+        raise ValueError('The run stopped at step ' + str(model_inst.timeStep) + ', before branching at step ' +
+                         str(branch_at))
+    return run_branches(model_inst, variants, steps, config, stop, workers, fork)
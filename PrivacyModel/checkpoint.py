@@ -0,0 +1,115 @@
+# Checkpoints of a run part-way through: the whole model (random generators, grid and occupants, every agent with its
+# attributes and EpsilonAgent history, the data collected so far) plus what the run loop needs to carry on (the number
+# of steps, the run's configuration and the stopping criterion's state), pickled and compressed into one file.
+#
+# The model is only pickled in the stepping thread, which is quick; compressing and writing the file is left to a
+# background thread, so a run is only held up for as long as taking the snapshot. Restoring a checkpoint and running it
+# to the end gives exactly the same results as the run that wrote it would have had.
+#
+#   checkpoints = Checkpointer('results/checkpoints/learning', every=500)
+#   modelDF = run_simulation(10000, EpsilonAgent, checkpoint=checkpoints)
+#   ... after a crash ...
+#   modelDF = resume_simulation(latest_checkpoint('results/checkpoints/learning'))
+
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+import pickle
+import zlib
+
+# First bytes of every checkpoint file, the digit is the format's version
+MAGIC = b'PMCHECKPOINT1\n'
+
+
+# Snapshot of a model and the state of its run as bytes, raises ValueError for a model that cannot be checkpointed
+def snapshot(model, **state):
+    if getattr(model, 'profiler', None) is not None:
+        raise ValueError('A profiled model cannot be checkpointed, its instrumented methods are not picklable')
+    return pickle.dumps(dict(state, model=model), protocol=5)
+
+
+# Writes a snapshot to path, through a temporary file so an interrupted write never replaces a good checkpoint
+def write_snapshot(path, data, level=1):
+    with open(path + '.tmp', 'wb') as file:
+        file.write(MAGIC)
+        file.write(zlib.compress(data, level))
+    os.replace(path + '.tmp', path)
+
+
+def save_checkpoint(path, model, **state):
+    write_snapshot(path, snapshot(model, **state))
+
+
+# Returns the state saved in a checkpoint, a dict with the model under 'model'. Only load checkpoints you wrote, like
+# any pickle they can run arbitrary code
+def load_checkpoint(path):
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + ' is not a checkpoint')
+        return pickle.loads(zlib.decompress(file.read()))
+
+
+# Most recent checkpoint written by a Checkpointer in directory, None if there is none
+def latest_checkpoint(directory):
+    paths = sorted(glob.glob(os.path.join(directory, 'step_*.ckpt')))
+    return paths[-1] if paths else None
+
+
+class Checkpointer:
+    """Writes a checkpoint of a run every `every` steps to directory, keeping the latest `keep` of them.
+
+    Called by the run loop after every step, see run_simulation. At most one checkpoint is being written at a time: if
+    the previous one is still being written when the next is due, the run waits for it, so at most two snapshots are
+    held in memory.
+    """
+
+    def __init__(self, directory, every=100, keep=2, level=1):
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.level = level
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, model, **state):
+        if model.timeStep % self.every == 0:
+            self.save(model, **state)
+
+    def save(self, model, **state):
+        data = snapshot(model, **state)
+        self.wait()
+        path = os.path.join(self.directory, 'step_{:010d}.ckpt'.format(model.timeStep))
+        self.pending = self.executor.submit(self.write, path, data)
+
+    def write(self, path, data):
+        write_snapshot(path, data, self.level)
+        for old in sorted(glob.glob(os.path.join(self.directory, 'step_*.ckpt')))[:-self.keep]:
+            os.remove(old)
+
+    # Waits for the checkpoint being written, raising any error writing it
+    def wait(self):
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            pending.result()
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Carries on the run saved in a checkpoint (a path or the state load_checkpoint returned) to the end, writing further
+# checkpoints with checkpoint if given. Returns the same results DataFrame as run_simulation
+def resume_simulation(saved, checkpoint=None):
+    from model import finish_simulation
+
+    if not isinstance(saved, dict):
+        saved = load_checkpoint(saved)
+    return finish_simulation(saved['model'], saved['steps'], saved['config'], stop=saved.get('stop'),
+                             checkpoint=checkpoint)
@@ -0,0 +1,160 @@
+# Data collector for per-agent and model-level reporters. A per-agent reporter returns one value per agent (in
+# unique_id order) as an array, which collect() copies into the next row of a preallocated (steps x N) NumPy buffer, so
+# a run's data takes 8 bytes per float64 value (1 for int8) instead of a boxed Python object in a list per agent per
+# step like Mesa's DataCollector keeps. Model-level reporters return one value, kept in a (steps,) buffer. The buffers
+# grow by doubling if a run goes on for more steps than reserved.
+#
+# Every reporter has its own interval, e.g. per-agent happiness every 10 steps and the population's metrics every step,
+# and nothing is collected before burn_in or while enabled is False. Lazy reporters are not collected at all but
+# computed from the collected buffers when asked for.
+#
+#   datacollector = ArrayDataCollector(N, {'Individual_Happiness': (happy_individual, np.float64, 10)},
+#                                      {'Average_Happiness': (average_happy, np.float64)}, burn_in=50)
+#   datacollector.collect(model)
+#   datacollector['Individual_Happiness']  # (steps collected x N) view, no copy
+#   datacollector.steps('Individual_Happiness')  # the time steps of its rows
+
+import numpy as np
+
+
+class ArrayDataCollector:
+    """Reporters collected into NumPy arrays, see the module comment.
+
+    agent_reporters and model_reporters map each variable's name to (function(model), dtype) or
+    (function(model), dtype, every): collected when model.timeStep - burn_in is a multiple of every, never if every is
+    0. lazy_reporters map a name to (function(collector), source), computed when asked for and aligned with the steps
+    of the source reporter. steps is how many rows to allocate up front.
+    """
+
+    def __init__(self, N, agent_reporters, model_reporters=None, lazy_reporters=None, steps=16, burn_in=0):
+        self.N = N
+        self.burnIn = burn_in
+        self.enabled = True
+        self.lazyReporters = lazy_reporters or {}
+        # name -> (function, every), per-agent and model-level reporters alike
+        self.reporters = {}
+        self.buffers = {}
+        self.timeSteps = {}
+        self.counts = {}
+        for reporters, shape in ((agent_reporters, (N,)), (model_reporters or {}, ())):
+            for name, (function, dtype, *every) in reporters.items():
+                self.reporters[name] = (function, every[0] if every else 1)
+                self.buffers[name] = np.empty((steps,) + shape, dtype=dtype)
+                self.timeSteps[name] = np.empty(steps, dtype=np.int64)
+                self.counts[name] = 0
+
+    def collect(self, model):
+        step = model.timeStep - self.burnIn
+        if not self.enabled or step < 0:
+            return
+        for name, (function, every) in self.reporters.items():
+            if every and step % every == 0:
+                row = self.counts[name]
+                if row == len(self.timeSteps[name]):
+                    self.grow(name, max(2 * row, 1))
+                self.buffers[name][row] = function(model)
+                self.timeSteps[name][row] = model.timeStep
+                self.counts[name] = row + 1
+
+    def grow(self, name, rows):
+        count = self.counts[name]
+        buffer = np.empty((rows,) + self.buffers[name].shape[1:], dtype=self.buffers[name].dtype)
+        buffer[:count] = self.buffers[name][:count]
+        self.buffers[name] = buffer
+        time_steps = np.empty(rows, dtype=np.int64)
+        time_steps[:count] = self.timeSteps[name][:count]
+        self.timeSteps[name] = time_steps
+
+    # Makes room for a run of steps steps in total, e.g. for the whole run before it starts
+    def reserve(self, steps):
+        for name, (function, every) in self.reporters.items():
+            rows = -(-(steps - self.burnIn) // every) if every and steps > self.burnIn else 0
+            if rows > len(self.timeSteps[name]):
+                self.grow(name, rows)
+
+    # Collected values of a reporter, a view of its buffer ((rows x N) per agent, (rows,) per model), or a lazy
+    # reporter's values computed now
+    def __getitem__(self, name):
+        if name in self.lazyReporters:
+            return self.lazyReporters[name][0](self)
+        return self.buffers[name][:self.counts[name]]
+
+    # Time steps the rows of a reporter were collected at
+    def steps(self, name):
+        if name in self.lazyReporters:
+            return self.steps(self.lazyReporters[name][1])
+        return self.timeSteps[name][:self.counts[name]]
+
+    # Views of every collected reporter, see __getitem__
+    def arrays(self):
+        return {name: self[name] for name in self.buffers}
+
+    # Same layout as Mesa's DataCollector: one column per collected reporter and one row per step, indexed by time step.
+    # A per-agent cell is a view of that step's row of the buffer; steps a reporter was not collected at are None (NaN
+    # for model-level reporters)
+    def get_model_vars_dataframe(self):
+        import pandas as pd
+
+        index = np.unique(np.concatenate([self.steps(name) for name in self.buffers] + [np.empty(0, dtype=np.int64)]))
+        columns = {}
+        for name, values in self.arrays().items():
+            rows = np.searchsorted(index, self.steps(name))
+            if values.ndim == 1:
+                column = np.full(len(index), np.nan)
+                column[rows] = values
+            else:
+                column = [None] * len(index)
+                for row, value in zip(rows.tolist(), values):
+                    column[row] = value
+            columns[name] = column
+        return pd.DataFrame(columns, index=index)
+
+    # Only the collected rows are pickled (e.g. in checkpoints), not the spare capacity
+    def __getstate__(self):
+        return dict(self.__dict__, buffers=self.arrays(),
+                    timeSteps={name: self.steps(name) for name in self.timeSteps})
+
+
+# storage.METRICS computed from the per-agent happiness and reward when asked for, at the steps those were collected
+def lazy_average_happiness(collector):
+    return collector['Individual_Happiness'].mean(axis=1)
+
+
+def lazy_max_happiness(collector):
+    return collector['Individual_Happiness'].max(axis=1, initial=-np.inf)
+
+
+def lazy_min_happiness(collector):
+    return collector['Individual_Happiness'].min(axis=1, initial=np.inf)
+
+
+def lazy_average_reward(collector):
+    return collector['Individual_Reward'].mean(axis=1)
+
+
+def lazy_below_average(collector):
+    happiness = collector['Individual_Happiness']
+    return (happiness < happiness.mean(axis=1, keepdims=True)).sum(axis=1)
+
+
+LAZY_METRICS = {'Average_Happiness': (lazy_average_happiness, 'Individual_Happiness'),
+                'Max_Happiness': (lazy_max_happiness, 'Individual_Happiness'),
+                'Min_Happiness': (lazy_min_happiness, 'Individual_Happiness'),
+                'Average_Reward': (lazy_average_reward, 'Individual_Reward'),
+                'Below_Average': (lazy_below_average, 'Individual_Happiness')}
+
+
+# Collector of a model's per-agent reporters (collected every step by default) and model-level metrics (only
+# collected if given an interval, otherwise lazy). collect maps reporter names to their interval, 0 to not collect one
+def population_collector(N, agent_reporters, model_reporters, collect=None, burn_in=0):
+    collect = collect or {}
+    unknown = set(collect) - set(agent_reporters) - set(model_reporters)
+    if unknown:
+        raise ValueError('Unknown reporters: ' + ', '.join(sorted(unknown)))
+    agents = {name: (function, dtype, collect.get(name, 1)) for name, (function, dtype) in agent_reporters.items()
+              if collect.get(name, 1)}
+    models = {name: (function, dtype, collect[name]) for name, (function, dtype) in model_reporters.items()
+              if collect.get(name)}
+    lazy = {name: LAZY_METRICS[name] for name in model_reporters
+            if name not in models and name in LAZY_METRICS and LAZY_METRICS[name][1] in agents}
+    return ArrayDataCollector(N, agents, models, lazy, burn_in=burn_in)
@@ -0,0 +1,69 @@
+# Stopping criteria for run_simulation. A criterion is called with the model after every step and returns True once
+# the tracked metric has stabilised, at which point the run stops early and records the step it converged at.
+
+from collections import deque
+import math
+
+from model import average_happy
+
+
+class RollingVariance:
+    """Converged once the variance of metric over the last window steps is below threshold."""
+
+    def __init__(self, metric=average_happy, window=20, threshold=0.01, min_steps=0):
+        self.metric = metric
+        self.window = window
+        self.threshold = threshold
+        self.min_steps = min_steps
+        self.reset()
+
+    def reset(self):
+        self.values = deque(maxlen=self.window)
+
+    def __call__(self, model):
+        self.values.append(self.metric(model))
+        if len(self.values) < self.window or model.timeStep < self.min_steps:
+            return False
+        mean = sum(self.values) / self.window
+        return sum((value - mean) ** 2 for value in self.values) / self.window < self.threshold
+
+
+class MeanShift:
+    """Converged once there is no change point between the last two windows of metric, i.e. the difference of their
+    means is under threshold standard errors (Welch's t statistic)."""
+
+    def __init__(self, metric=average_happy, window=20, threshold=1.0, min_steps=0):
+        if window < 2:
+            raise ValueError('MeanShift needs a window of at least 2 steps')
+        self.metric = metric
+        self.window = window
+        self.threshold = threshold
+        self.min_steps = min_steps
+        self.reset()
+
+    def reset(self):
+        self.values = deque(maxlen=2 * self.window)
+
+    def __call__(self, model):
+        self.values.append(self.metric(model))
+        if len(self.values) < 2 * self.window or model.timeStep < self.min_steps:
+            return False
+        values = list(self.values)
+        before, after = values[:self.window], values[self.window:]
+        mean_before = sum(before) / self.window
+        mean_after = sum(after) / self.window
+        variance_before = sum((value - mean_before) ** 2 for value in before) / (self.window - 1)
+        variance_after = sum((value - mean_after) ** 2 for value in after) / (self.window - 1)
+        standard_error = math.sqrt((variance_before + variance_after) / self.window)
+        if standard_error == 0:
+            return mean_before == mean_after
+        return abs(mean_after - mean_before) / standard_error < self.threshold
+
+
+CRITERIA = {'rolling_variance': RollingVariance, 'mean_shift': MeanShift}
+
+
+# Builds a criterion from a JSON-friendly spec such as {"criterion": "rolling_variance", "window": 20}, for sweeps
+def criterion_from_spec(spec):
+    spec = dict(spec)
+    return CRITERIA[spec.pop('criterion')](**spec)
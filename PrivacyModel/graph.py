@@ -0,0 +1,140 @@
+# Friendship graphs stored as CSR (compressed sparse row) arrays: the friends of agent i are
+# indices[indptr[i]:indptr[i + 1]], in ascending order. This takes a few bytes per friendship instead of networkx's
+# dict-of-dicts, and a friend lookup is an array slice.
+#
+# watts_strogatz builds the small-world graph the models use with array operations (a ring lattice, then a share of
+# its edges rewired to random agents), so graphs of 10^6 agents take seconds, reproducibly from a seed.
+
+import numpy as np
+
+# Spawn key of the graph's random stream, so a graph drawn from a seed is not correlated with the other generators the
+# models seed with the same seed
+GRAPH_STREAM = 1
+
+
+class CSRGraph:
+    """Undirected graph of n nodes as CSR arrays (indptr, indices), neighbours of each node in ascending order."""
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    # Graph with the edges (source[e], target[e]), which must not repeat or be self-loops
+    @classmethod
+    def fromEdges(cls, n, source, target):
+        rows = np.concatenate([source, target]).astype(np.int64)
+        columns = np.concatenate([target, source]).astype(np.int64)
+        order = np.argsort(rows * n + columns, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(indptr, columns[order].astype(index_dtype(n)))
+
+    @classmethod
+    def fromNetworkx(cls, graph):
+        n = graph.number_of_nodes()
+        degree = np.fromiter((len(graph.adj[i]) for i in range(n)), dtype=np.int64, count=n)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        indices = np.fromiter((j for i in range(n) for j in sorted(graph.adj[i])), dtype=index_dtype(n),
+                              count=indptr[-1])
+        return cls(indptr, indices)
+
+    def number_of_nodes(self):
+        return len(self.indptr) - 1
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def degree(self, i):
+        return int(self.indptr[i + 1] - self.indptr[i])
+
+    # Friends of node i, a view of indices rather than a copy
+    def neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def hasEdge(self, i, j):
+        friends = self.neighbours(i)
+        position = np.searchsorted(friends, j)
+        return position < len(friends) and friends[position] == j
+
+    # Node of every entry of indices, i.e. (owners[e], indices[e]) are all the (node, neighbour) pairs
+    def owners(self):
+        return np.repeat(np.arange(self.number_of_nodes(), dtype=np.int64), np.diff(self.indptr))
+
+    # The adjacency matrix as a scipy.sparse.csr_matrix, sharing the index arrays
+    def toScipy(self):
+        from scipy.sparse import csr_matrix
+
+        n = self.number_of_nodes()
+        return csr_matrix((np.ones(len(self.indices), dtype=np.int8), self.indices, self.indptr), shape=(n, n))
+
+
+# Smallest integer type the node ids of a graph of n nodes fit in
+def index_dtype(n):
+    return np.int32 if n < 2 ** 31 else np.int64
+
+
+# Key of the undirected edge (u, v), the same whichever way round it is given
+def edge_key(u, v, n):
+    return np.minimum(u, v).astype(np.int64) * n + np.maximum(u, v)
+
+
+# Random generator of a graph, seed is an int (or None) or an existing numpy Generator
+def graph_rng(seed):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(GRAPH_STREAM,)))
+
+
+# Watts-Strogatz small-world graph like networkx.watts_strogatz_graph: every node is joined to its k // 2 nearest
+# neighbours on each side of a ring, then each of those edges is rewired with probability p, keeping its first node
+# and moving its other end to a node picked uniformly at random. A new end that would make a self-loop or repeat an
+# edge is drawn again, all the edges waiting for a new end are drawn at once in each round. The rare edges still
+# without one after max_rounds (only when nodes are nearly connected to everyone) keep their lattice end if it is free
+def watts_strogatz(n, k, p, seed=None, max_rounds=100):
+    if k > n:
+        raise ValueError('k (' + str(k) + ') must not be greater than n (' + str(n) + ')')
+    if k == n:
+        source, target = np.triu_indices(n, 1)
+        return CSRGraph.fromEdges(n, source, target)
+
+    rng = graph_rng(seed)
+    half = k // 2
+    source = np.repeat(np.arange(n, dtype=np.int64), half)
+    target = (source + np.tile(np.arange(1, half + 1), n)) % n
+    keep = np.ones(len(source), dtype=bool)
+
+    rewire = rng.random(len(source)) < p
+    taken = np.sort(edge_key(source[~rewire], target[~rewire], n))
+    pending = np.flatnonzero(rewire)
+    for i in range(max_rounds):
+        if not len(pending):
+            break
+        end = rng.integers(0, n, len(pending))
+        proposal = edge_key(source[pending], end, n)
+        valid = np.flatnonzero((end != source[pending]) & ~np.isin(proposal, taken))
+        # Of equal proposals in the same round only the first is accepted
+        valid = valid[np.unique(proposal[valid], return_index=True)[1]]
+        target[pending[valid]] = end[valid]
+        taken = np.union1d(taken, proposal[valid])
+        pending = np.delete(pending, valid)
+
+    if len(pending):
+        left = edge_key(source[pending], target[pending], n)
+        free = ~np.isin(left, taken)
+        free[free] = np.isin(np.arange(free.sum()), np.unique(left[free], return_index=True)[1])
+        keep[pending[~free]] = False
+
+    return CSRGraph.fromEdges(n, source[keep], target[keep])
+
+
+# The CSRGraph of a model's relationship argument (a CSRGraph or a networkx graph), generated from the seed when there
+# is none
+def relationship_graph(relationship, N, num_of_friends, rewire, seed):
+    if relationship is None:
+        return watts_strogatz(N, num_of_friends, rewire, seed=seed)
+    if isinstance(relationship, CSRGraph):
+        return relationship
+    return CSRGraph.fromNetworkx(relationship)
@@ -0,0 +1,94 @@
+# Where agents move to at the end of a step. A PlaceDistribution gives the chance of going to each place, either the
+# same for everyone or one per privacy type, and is sampled with alias tables (Vose's method), so picking a place is
+# O(1) whatever the distribution: one uniform draw picks a column of the table and is then compared with the column's
+# threshold to keep the column's place or take its alias.
+#
+# PrivacyModel and VectorizedPrivacyModel take one as mobility (or the weights to make one from), and with
+# batch_moves=True PrivacyModel samples every agent's next place in one call to sample() at the end of the step instead
+# of each agent moving on its own.
+
+import numpy as np
+
+from agents import AgentConstants
+
+NUM_OF_PLACES = len(AgentConstants.places_dict)
+NUM_OF_PRIVACY_TYPES = 3
+
+
+# Alias table (threshold, alias) of one distribution, place i is kept if the fractional part of the draw is below
+# threshold[i], otherwise it is alias[i]
+def alias_table(probabilities):
+    scaled = np.asarray(probabilities, dtype=float) * len(probabilities)
+    threshold = np.ones(len(probabilities))
+    alias = np.arange(len(probabilities))
+    small = [i for i in range(len(scaled)) if scaled[i] < 1]
+    large = [i for i in range(len(scaled)) if scaled[i] >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        threshold[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    # Whatever is left over is 1 up to rounding errors, so always kept
+    return threshold, alias
+
+
+class PlaceDistribution:
+    """Chance of moving to each place, per privacy type.
+
+    weights are either one weight per place, used for every privacy type, or a (privacy type x place) table of weights,
+    each row is normalised.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim == 1:
+            weights = np.tile(weights, (NUM_OF_PRIVACY_TYPES, 1))
+        if weights.shape != (NUM_OF_PRIVACY_TYPES, NUM_OF_PLACES):
+            raise ValueError('Place weights must have ' + str(NUM_OF_PLACES) + ' places, or be a (' +
+                             str(NUM_OF_PRIVACY_TYPES) + ' x ' + str(NUM_OF_PLACES) + ') table, got shape ' +
+                             str(weights.shape))
+        if (weights < 0).any() or (weights.sum(axis=1) <= 0).any():
+            raise ValueError('Place weights must be non-negative with at least one positive weight per privacy type')
+        self.probabilities = weights / weights.sum(axis=1, keepdims=True)
+
+        tables = [alias_table(row) for row in self.probabilities]
+        self.threshold = np.array([threshold for threshold, alias in tables])
+        self.alias = np.array([alias for threshold, alias in tables])
+        # Plain lists for drawing one place at a time from Python
+        self.thresholdList = self.threshold.tolist()
+        self.aliasList = self.alias.tolist()
+
+    @classmethod
+    def uniform(cls):
+        return cls(np.ones(NUM_OF_PLACES))
+
+    # Place for an agent of privacy_type given a uniform draw u in [0, 1)
+    def place(self, privacy_type, u):
+        scaled = u * NUM_OF_PLACES
+        column = min(int(scaled), NUM_OF_PLACES - 1)
+        if scaled - column < self.thresholdList[privacy_type][column]:
+            return column
+        return self.aliasList[privacy_type][column]
+
+    # Places for a whole population of privacy_types, with a single draw from the NumPy generator rng
+    def sample(self, rng, privacy_types):
+        return self.places(privacy_types, rng.random(len(privacy_types)))
+
+    # Places for privacy_types given their uniform draws u
+    def places(self, privacy_types, u):
+        scaled = u * NUM_OF_PLACES
+        column = np.minimum(scaled.astype(np.intp), NUM_OF_PLACES - 1)
+        keep = scaled - column < self.threshold[privacy_types, column]
+        return np.where(keep, column, self.alias[privacy_types, column])
+
+
+# The PlaceDistribution of a model's mobility argument, None (the original uniform moves) stays None
+def place_distribution(mobility):
+    if mobility is None or isinstance(mobility, PlaceDistribution):
+        return mobility
+    return PlaceDistribution(mobility)
@@ -1,143 +1,319 @@
+# Only light modules are imported here so process-pool workers can import PrivacyModel quickly, pandas is only imported
+# once a run's results DataFrame is made. Run as a script for the command line, see python model.py --help
+import argparse
+import itertools
+import os
+import random
+
 from mesa import Model
-from mesa.time import RandomActivation
-from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
-import networkx as nx
+from mesa.time import BaseScheduler, RandomActivation, StagedActivation
+from mesa.space import MultiGrid, accept_tuple_argument
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import csv
 
 # Import all the different types of agents
 from agents.RandomAgent import RandomAgent
 from agents.BasicAgent import BasicAgent
 from agents.MajorityAgent import MajorityAgent
 from agents.EpsilonAgent import EpsilonAgent
+from agents import AgentConstants
+from stats import PopulationStats
+from storage import write_run
+from profiling import Profiler
+from collector import population_collector
+from mobility import PlaceDistribution, place_distribution
+from graph import relationship_graph
+from rng import CounterStreams
 
 NUM_OF_AGENTS = 20
 
+# Agent models by the name their results files are saved under
+AGENT_MODELS = {'random': RandomAgent, 'basic': BasicAgent, 'majority': MajorityAgent, 'learning': EpsilonAgent}
+
 
 # External metric functions
+# Happiness metrics are read from the model's PopulationStats, which the agents keep up to date as they act
 def average_happy(model):
-    happy_agents = [agent.happy for agent in model.schedule.agents]
-    return sum(happy_agents) / NUM_OF_AGENTS
+    return model.populationStats.mean
 
 
 def max_happy(model):
-    all_agents = [agent.happy for agent in model.schedule.agents]
-    return max(all_agents)
+    return model.populationStats.max
 
 
 def min_happy(model):
-    all_agents = [agent.happy for agent in model.schedule.agents]
-    return min(all_agents)
+    return model.populationStats.min
 
 
 def average_reward(model):
     reward_agents = [agent.reward for agent in model.schedule.agents]
-    return sum(reward_agents) / NUM_OF_AGENTS
+    return sum(reward_agents) / model.num_agents
 
 def below_average(model):
-    average = average_happy(model)
-    below_average_agents = [agent.happy for agent in model.schedule.agents if agent.happy < average]
-    return len(below_average_agents)
+    return model.populationStats.countBelowMean()
 
+# Per-agent reporters return an array in unique_id order, which the ArrayDataCollector copies into its buffers
 def happy_individual(model):
-    individual_agents = [agent.happy for agent in model.schedule.agents]
-    return individual_agents
+    return model.populationStats.values
 
 def agent_privacy(model):
-    all_agents = [agent.privacyType for agent in model.schedule.agents]
-    return all_agents
+    return model.privacyTypes
+
+def agent_action(model):
+    return np.fromiter((agent.currentAction for agent in model.schedule.agents), dtype=np.int8, count=model.num_agents)
+
+def individual_reward(model):
+    return np.fromiter((agent.reward for agent in model.schedule.agents), dtype=np.float64, count=model.num_agents)
+
+# Reporters of the data collector and the type their values are kept as
+AGENT_REPORTERS = {"Individual_Happiness": (happy_individual, np.float64),
+                   "Agent_Privacy": (agent_privacy, np.int8),
+                   "Agent_Action": (agent_action, np.int8),
+                   "Individual_Reward": (individual_reward, np.float64)}
+MODEL_REPORTERS = {"Average_Happiness": (average_happy, np.float64),
+                   "Max_Happiness": (max_happy, np.float64),
+                   "Min_Happiness": (min_happy, np.float64),
+                   "Average_Reward": (average_reward, np.float64),
+                   "Below_Average": (below_average, np.int64)}
 
 def location_agents(model):
     all_agents = [agent.pos for agent in model.schedule.agents]
     return all_agents
 
 
+class PlaceGrid(MultiGrid):
+    """MultiGrid whose cells are dicts of the agents there keyed by unique_id instead of lists, so placing, moving and
+    removing an agent takes constant time however many agents share its cell. The cells are the model's occupants."""
+
+    @staticmethod
+    def default_val():
+        return {}
+
+    def _place_agent(self, pos, agent):
+        x, y = pos
+        self.grid[x][y][agent.unique_id] = agent
+        self.empties.discard(pos)
+
+    def _remove_agent(self, pos, agent):
+        x, y = pos
+        del self.grid[x][y][agent.unique_id]
+        if not self.grid[x][y]:
+            self.empties.add(pos)
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(self, cell_list):
+        return itertools.chain.from_iterable(self.grid[x][y].values() for x, y in cell_list)
+
+
+class CounterActivation(BaseScheduler):
+    """Activates the agents in the counter-based random order of each step (see rng.py) instead of shuffling them with
+    the model's random stream, calling method ('step', or 'decision' for batch moves) of each."""
+
+    def __init__(self, model, method='step'):
+        super().__init__(model)
+        self.method = method
+
+    def step(self):
+        agent_keys = list(self._agents.keys())
+        for i in self.model.streams.order(self.model.timeStep, len(agent_keys)).tolist():
+            getattr(self._agents[agent_keys[i]], self.method)()
+        self.steps += 1
+        self.time += 1
+
+
 class PrivacyModel(Model):
     """A model with some number of agents."""
 
-    def __init__(self, agent_model, N, num_of_friends=6, rewire=0.1):
+    def __init__(self, agent_model, N, num_of_friends=6, rewire=0.1, preferences=None, seed=102,
+                 privacy_population=2, profile=None, mobility=None, batch_moves=False, relationship=None,
+                 counter_rng=False, collect=None, burn_in=0, snapshot_history=False):
         self.num_agents = N
-        self.grid = MultiGrid(9, 1, False)
-        self.schedule = RandomActivation(self)
+        self.grid = PlaceGrid(9, 1, False)
+        # Distribution of the places agents move to (see mobility.py), None for the original uniform moves. With
+        # batch_moves the agents only decide when activated, and everyone's next place is then sampled at once
+        self.mobility = place_distribution(mobility)
+        self.batchMoves = batch_moves
+        # With counter_rng the agents' draws are counter-based (see rng.py) instead of taken in turn from self.random,
+        # so they do not depend on the order the agents are activated in, and that order is drawn the same way
+        self.streams = CounterStreams(seed) if counter_rng else None
+        if batch_moves:
+            if self.mobility is None:
+                self.mobility = PlaceDistribution.uniform()
+            self.rng = np.random.default_rng(seed)
+        if counter_rng:
+            self.schedule = CounterActivation(self, 'decision' if batch_moves else 'step')
+        elif batch_moves:
+            self.schedule = StagedActivation(self, ['decision'], shuffle=True)
+        else:
+            self.schedule = RandomActivation(self)
         self.running = True
         # Using random seeds for replicating results (100, 101, 102)
-        self.random.seed(102)
+        self.seed = seed
+        # mesa's Model keeps random on the class, where every model made (or unpickled) replaces it, so each model
+        # gets its own generator, which is also saved with the model when it is checkpointed
+        self.random = random.Random(seed)
 
         # Setting privacy type of all agents (-1 for spread, 0-2 for fixed)
-        self.privacyPopulation = 2
-
-        # Initialise relationship between agents as a Watts-Strogatz graph
-        self.relationship = nx.watts_strogatz_graph(N, num_of_friends, rewire)
+        self.privacyPopulation = privacy_population
+
+        # Value of each action at each place for each privacy type, only rebuilt if the model is given its own
+        # preference weights (format- [pleasure, recognition, privacy, security] per privacy type)
+        if preferences is None:
+            self.preferences = AgentConstants.preferences
+            self.actionValues = AgentConstants.action_values
+        else:
+            self.preferences = preferences
+            self.actionValues = AgentConstants.build_action_values(preferences)
+
+        # Initialise relationship between agents as a Watts-Strogatz graph, stored as CSR arrays (see graph.py). A
+        # prebuilt graph can be given instead, e.g. the networkx graph older runs used
+        self.relationship = relationship_graph(relationship, N, num_of_friends, rewire, seed)
+        # Start of each agent's friends in the graph's indices as a list, which is faster to look up from Python
+        self.friendsPtr = self.relationship.indptr.tolist()
+
+        # With snapshot_history each row of a learning agent's history is matched against the companions of its own
+        # step, and every past interaction with a companion counts once in its estimates. The original model's rows
+        # all held the agent's current companions, so every past row counted for every current companion, and the
+        # published SIPA results were made that way. Changes EpsilonAgent's results, off by default
+        self.snapshotHistory = snapshot_history
 
         # For keeping track of time for agent's history
         self.timeStep = 0
 
+        # Sum, min, max and count of the agents' happiness, updated by the agents whenever it changes
+        self.populationStats = PopulationStats(N)
+
+        # Agents at each place keyed by unique_id, the grid's own cells, so companions can be found without scanning
+        # the whole schedule
+        self.occupants = {(x, 0): self.grid.grid[x][0] for x in range(self.grid.width)}
+
+        # Per-phase timings of step() (see profiling.py), only when profiling as instrumenting adds a little to every
+        # call. profile can also be a Profiler shared with other runs
+        if profile:
+            self.profiler = profile if isinstance(profile, Profiler) else Profiler()
+            agent_model = self.profiler.instrument(agent_model)
+        else:
+            self.profiler = None
+
         # Create agents
         for i in range(self.num_agents):
             a = agent_model(i, self)
             self.schedule.add(a)
             # Start off with every agent in a random place
-            random_place = self.random.randint(0, 8)
-            self.grid.place_agent(a, (random_place, 0))
-        self.datacollector = DataCollector(
-            # model_reporters={"Average_Happiness": average_happy,
-            #                  "Max_Happiness": max_happy,
-            #                  "Min_Happiness": min_happy,
-            #                  "Average_Reward": average_reward,
-            #                  "Below_Average": below_average}
-            model_reporters={"Individual_Happiness": happy_individual,
-                             "Agent_Privacy": agent_privacy}
-        )
+            if self.streams is None:
+                random_place = self.random.randint(0, 8)
+            else:
+                random_place = int(self.streams.uniform('place', self.timeStep, i, N) * 9)
+            self.placeAgent(a, (random_place, 0))
+        self.privacyTypes = np.array([agent.privacyType for agent in self.schedule.agents], dtype=np.intp)
+        # Per-agent variables collected into (steps x N) arrays, every step unless collect gives a reporter another
+        # interval, and nothing before step burn_in. The population's metrics are only collected if given an interval
+        # in collect, otherwise they are computed from the per-agent arrays when asked for, see collector.py
+        self.datacollector = population_collector(N, AGENT_REPORTERS, MODEL_REPORTERS, collect, burn_in)
+        if self.profiler is not None:
+            self.profiler.instrumentModel(self, agent_model)
+
+    def placeAgent(self, agent, pos):
+        self.grid.place_agent(agent, pos)
+
+    def moveAgent(self, agent, pos):
+        self.grid.move_agent(agent, pos)
+
+    # Moves every agent to a place sampled from the mobility distribution in one go, rebuilding the grid's cells (the
+    # occupants) instead of moving the agents one at a time
+    def moveAgents(self):
+        if self.streams is None:
+            places = self.mobility.sample(self.rng, self.privacyTypes).tolist()
+        else:
+            draws = self.streams.uniforms('move', self.timeStep, np.arange(self.num_agents))
+            places = self.mobility.places(self.privacyTypes, draws).tolist()
+        cells = [{} for x in range(self.grid.width)]
+        for agent, x in zip(self.schedule.agents, places):
+            agent.pos = (x, 0)
+            cells[x][agent.unique_id] = agent
+        for x in range(self.grid.width):
+            self.grid.grid[x][0] = self.occupants[(x, 0)] = cells[x]
+        self.grid.empties = {(x, 0) for x in range(self.grid.width) if not cells[x]}
+
+    # Uniform draw in [0, 1) of an agent for purpose (see rng.PURPOSES): the next one from self.random, or with
+    # counter_rng the agent's own draw for this step
+    def uniform(self, purpose, unique_id):
+        if self.streams is None:
+            return self.random.uniform(0, 1)
+        return self.streams.uniform(purpose, self.timeStep, unique_id, self.num_agents)
+
+    # An agent's random pick out of choices, drawn like uniform()
+    def choice(self, purpose, unique_id, choices):
+        if self.streams is None:
+            return self.random.choice(choices)
+        return choices[int(self.streams.uniform(purpose, self.timeStep, unique_id, self.num_agents) * len(choices))]
+
+    # Friends of an agent that are at the same place as it, in unique_id order (the order of the schedule), friends
+    # are already sorted in the graph
+    def companionsOf(self, agent):
+        occupants = self.occupants[agent.pos]
+        friends = self.relationship.indices[self.friendsPtr[agent.unique_id]:self.friendsPtr[agent.unique_id + 1]]
+        return [occupants[i] for i in friends.tolist() if i in occupants]
 
     def step(self):
         self.datacollector.collect(self)
         '''Advance the model by one step.'''
         self.schedule.step()
+        if self.batchMoves:
+            self.moveAgents()
         self.timeStep += 1
 
 
-def run_simulation(steps, agent_model):
-    num_of_friends = 8
-    rewire = 0.3
-    model_inst = PrivacyModel(agent_model, NUM_OF_AGENTS, num_of_friends, rewire)
-    for i in range(steps):
+# Runs a model for at most steps steps. If a stopping criterion is given (see convergence.py) it is checked after every
+# step and the run stops as soon as it fires, the step it converged at is kept in modelDF.attrs['converged_at']
+# (None if it ran for all the steps). With profile the per-phase timings of the run are kept in
+# modelDF.attrs['profile']. With checkpoint (a checkpoint.Checkpointer) the run is checkpointed as it goes and can be
+# carried on with checkpoint.resume_simulation. collect and burn_in set what is collected when, snapshot_history how
+# learning agents read their history, see PrivacyModel
+def run_simulation(steps, agent_model, seed=102, N=NUM_OF_AGENTS, num_of_friends=8, rewire=0.3, privacy_population=2,
+                   stop=None, profile=None, checkpoint=None, collect=None, burn_in=0, snapshot_history=False):
+    model_inst = PrivacyModel(agent_model, N, num_of_friends, rewire, seed=seed, privacy_population=privacy_population,
+                              profile=profile, collect=collect, burn_in=burn_in, snapshot_history=snapshot_history)
+    config = {'agent': agent_model.__name__, 'N': N, 'num_of_friends': num_of_friends, 'rewire': rewire,
+              'privacy_population': privacy_population, 'seed': seed, 'steps': steps}
+    if collect or burn_in:
+        config.update(collect=collect, burn_in=burn_in)
+    if snapshot_history:
+        config.update(snapshot_history=True)
+    if stop is not None:
+        stop.reset()
+    return finish_simulation(model_inst, steps, config, stop, checkpoint)
+
+
+# Steps a model (new or restored from a checkpoint) until it has run steps steps or stop fires, and returns its results
+def finish_simulation(model_inst, steps, config, stop=None, checkpoint=None):
+    converged_at = None
+    model_inst.datacollector.reserve(steps)
+    while model_inst.timeStep < steps:
         model_inst.step()
+        if stop is not None and stop(model_inst):
+            converged_at = model_inst.timeStep
+            model_inst.running = False
+            break
+        if checkpoint is not None:
+            checkpoint(model_inst, steps=steps, config=config, stop=stop)
+    if checkpoint is not None:
+        checkpoint.wait()
     modelDF = model_inst.datacollector.get_model_vars_dataframe()
+    modelDF.attrs['converged_at'] = converged_at
+    modelDF.attrs['config'] = config
+    if model_inst.profiler is not None:
+        modelDF.attrs['profile'] = model_inst.profiler.summary()
 
     return modelDF
 
 
-# Function for writing the results of a agent model into a .csv file
-def write_results(df, agent):
-    with open('./results/' + agent + '_casual_results.csv', 'w', newline='') as file:
-        i = 0
-        writer = csv.writer(file)
-
-
-        for row in df.iterrows():
-            #writer.writerow([i, row[1][0], row[1][1], row[1][2], row[1][3], row[1][4]])
-            #writer.writerow([i, row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10],
-                             #row[11], row[12], row[13], row[14], row[15], row[16], row[17], row[18], row[19]])
-            if i == 0:
-                array = np.array_split(row[1][1], 20)
-                writer.writerow([i, array[0][0], array[1][0], array[2][0], array[3][0], array[4][0], array[5][0],
-                                 array[6][0], array[7][0], array[8][0], array[9][0], array[10][0], array[11][0],
-                                 array[12][0], array[13][0], array[14][0], array[15][0], array[16][0], array[17][0],
-                                 array[18][0], array[19][0]])
-            else:
-                # Splitting arr into ints
-                array = np.array_split(row[1][0], 20)
-                writer.writerow([i, array[0][0], array[1][0], array[2][0], array[3][0], array[4][0], array[5][0],
-                                 array[6][0], array[7][0], array[8][0], array[9][0], array[10][0], array[11][0],
-                                 array[12][0], array[13][0], array[14][0], array[15][0], array[16][0], array[17][0],
-                                 array[18][0], array[19][0]])
-            i += 1
+# Function for writing the results of a agent model into a binary .npz file, holding (steps x agents) arrays of
+# happiness, privacy type, action and reward plus the run's configuration, see storage.py
+def write_results(df, agent, output='./results'):
+    write_run(os.path.join(output, agent + '_results.npz'), df)
 
 
-# Main function for running all agent models, then write all their results on their respective .csv files
+# Main function for running all agent models, then write all their results on their respective .npz files
 def run_all_agents(steps):
     print('random running ...')
     random = run_simulation(steps, RandomAgent)
@@ -156,12 +332,28 @@ def run_all_agents(steps):
     write_results(learning, 'learning')
 
 
-steps = 200
-
-run_all_agents(steps)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run agent models and save each run as a .npz results file.')
+    parser.add_argument('--agents', nargs='+', choices=list(AGENT_MODELS), default=list(AGENT_MODELS))
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('-N', type=int, default=NUM_OF_AGENTS, help='number of agents')
+    parser.add_argument('--seeds', nargs='+', type=int, default=[102],
+                        help='one run per seed, with more than one seed the seed is added to the file names')
+    parser.add_argument('--output', default='./results', help='directory the results files are written to')
+    parser.add_argument('--snapshot-history', action='store_true',
+                        help='learning agents only count their real past interactions with each companion (changes '
+                             'their results from the published ones)')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for name in args.agents:
+        for seed in args.seeds:
+            print(name, 'running ...' if len(args.seeds) == 1 else 'seed ' + str(seed) + ' running ...')
+            modelDF = run_simulation(args.steps, AGENT_MODELS[name], seed=seed, N=args.N,
+                                     snapshot_history=args.snapshot_history)
+            write_results(modelDF, name if len(args.seeds) == 1 else name + '_' + str(seed), args.output)
 
 # one more level of average - run simulation multiple times
-# check when a plot stabilises, so we can stop earlier
 # check for violating norms
 # in history, pick out policies of other agents
 
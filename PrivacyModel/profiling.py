@@ -0,0 +1,92 @@
+# Per-phase timings of PrivacyModel.step(). A model made with profile=True (or given a Profiler to share between runs)
+# uses an instrumented subclass of its agent class whose decision phases are timed, and times its datacollector.collect
+# and schedule.step, everything summed per agent class. Without profile nothing is wrapped, so it costs nothing.
+#
+#   model_inst = PrivacyModel(EpsilonAgent, 200, profile=True)
+#   ...
+#   print(model_inst.profiler.report())
+
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+
+# Agent methods that are timed and the phase each is reported as. decision includes the location, companions, epsilon,
+# reward and majority vote phases it calls
+AGENT_PHASES = {'decision': 'decision',
+                'processLocation': 'location',
+                'updateCompanions': 'companions',
+                'epsilon': 'epsilon',
+                'processCompanions': 'reward',
+                'majorityVote': 'majority vote',
+                'move': 'move'}
+
+# Phases of the model, schedule includes every agent's decision and move (moves is the batched moves of all agents,
+# when the model has batch_moves)
+MODEL_PHASES = ('collect', 'schedule', 'moves')
+
+
+class Profiler:
+    """Total wall time and number of calls of every (agent class, phase)."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.classes = {}
+
+    # Wraps function so every call adds to the time of key
+    def timed(self, function, key):
+        seconds = self.seconds
+        calls = self.calls
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[key] += perf_counter() - start
+                calls[key] += 1
+
+        return wrapper
+
+    # Subclass of agent_model (with the same name) whose phases are timed, made once per agent class
+    def instrument(self, agent_model):
+        if agent_model not in self.classes:
+            methods = {name: self.timed(getattr(agent_model, name), (agent_model.__name__, phase))
+                       for name, phase in AGENT_PHASES.items() if hasattr(agent_model, name)}
+            self.classes[agent_model] = type(agent_model.__name__, (agent_model,), dict(methods, __slots__=()))
+        return self.classes[agent_model]
+
+    # Times the model phases, only wrapping that model's own datacollector, schedule and moves
+    def instrumentModel(self, model, agent_model):
+        model.datacollector.collect = self.timed(model.datacollector.collect, (agent_model.__name__, 'collect'))
+        model.schedule.step = self.timed(model.schedule.step, (agent_model.__name__, 'schedule'))
+        if model.batchMoves:
+            model.moveAgents = self.timed(model.moveAgents, (agent_model.__name__, 'moves'))
+
+    # {agent class: {phase: {'seconds', 'calls', 'per_call_us'}}}, phases in the order of MODEL_PHASES then AGENT_PHASES
+    def summary(self):
+        order = list(MODEL_PHASES) + list(AGENT_PHASES.values())
+        summary = {}
+        for (name, phase) in sorted(self.seconds, key=lambda key: (key[0], order.index(key[1]))):
+            seconds = self.seconds[(name, phase)]
+            calls = self.calls[(name, phase)]
+            summary.setdefault(name, {})[phase] = {'seconds': seconds, 'calls': calls,
+                                                   'per_call_us': 1e6 * seconds / calls if calls else 0.0}
+        return summary
+
+    # The summary as a table, with each phase's share of the time spent in the model phases (collect, schedule, moves)
+    def report(self):
+        lines = []
+        for name, phases in self.summary().items():
+            total = sum(phases[phase]['seconds'] for phase in MODEL_PHASES if phase in phases)
+            lines.append(name)
+            for phase, timing in phases.items():
+                lines.append('  {:14} {:10.4f} s {:6.1f}% {:10} calls {:10.2f} us/call'.format(
+                    phase, timing['seconds'], 100 * timing['seconds'] / total if total else 0.0, timing['calls'],
+                    timing['per_call_us']))
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
@@ -0,0 +1,45 @@
+# Runs replications of the simulation with different seeds in a process pool, so independent runs use every core
+# instead of running one after another
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import os
+
+from model import AGENT_MODELS, run_simulation, write_results
+
+
+# Runs in the worker process, the seed (and agent model name) are sent back with the results
+def run_replication(name, agent_model, steps, seed, stop=None):
+    return name, seed, run_simulation(steps, agent_model, seed, stop=stop)
+
+
+# Runs every (agent model, seed) pair in one pool, yielding (name, seed, results DataFrame) as soon as each run
+# finishes, in completion order. stop is an optional stopping criterion from convergence.py, each run gets its own copy
+def run_all_replications(agent_models, seeds, workers=None, steps=200, stop=None):
+    jobs = [(name, agent_model, seed) for name, agent_model in agent_models.items() for seed in seeds]
+    workers = min(workers or os.cpu_count(), len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_replication, name, agent_model, steps, seed, stop)
+                   for name, agent_model, seed in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# Same for a single agent model, yielding (seed, results DataFrame)
+def run_replications(agent_model, seeds, workers=None, steps=200, stop=None):
+    for name, seed, modelDF in run_all_replications({agent_model.__name__: agent_model}, seeds, workers, steps, stop):
+        yield seed, modelDF
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run replications of every agent model in parallel.')
+    parser.add_argument('--agents', nargs='+', choices=list(AGENT_MODELS), default=list(AGENT_MODELS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[100, 101, 102, 103, 104])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--steps', type=int, default=200)
+    args = parser.parse_args()
+
+    agent_models = {name: AGENT_MODELS[name] for name in args.agents}
+    for name, seed, modelDF in run_all_replications(agent_models, args.seeds, args.workers, args.steps):
+        print(name, 'seed', seed, 'done')
+        write_results(modelDF, name + '_' + str(seed))
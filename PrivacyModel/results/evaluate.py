@@ -1,157 +1,170 @@
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.stats import ttest_rel
 import seaborn as sns
 
-plt.close("all")
-
-# PLOTTING
-
-# The averages of the results for each model
-random_results1 = pd.read_csv("random_results/random_results1.csv")
-random_results2 = pd.read_csv("random_results/random_results2.csv")
-random_results3 = pd.read_csv("random_results/random_results3.csv")
-random_results4 = pd.read_csv("random_results/random_results4.csv")
-random_results5 = pd.read_csv("random_results/random_results5.csv")
-
-random_results_total = pd.concat([random_results1, random_results2, random_results3, random_results4, random_results5])
-random_results_mean = random_results_total.groupby(random_results_total.index).mean()
-
-basic_results1 = pd.read_csv("basic_results/basic_results1.csv")
-basic_results2 = pd.read_csv("basic_results/basic_results2.csv")
-basic_results3 = pd.read_csv("basic_results/basic_results3.csv")
-basic_results4 = pd.read_csv("basic_results/basic_results4.csv")
-basic_results5 = pd.read_csv("basic_results/basic_results5.csv")
-
-basic_results_total = pd.concat([basic_results1, basic_results2, basic_results3, basic_results4, basic_results5])
-basic_results_mean = basic_results_total.groupby(basic_results_total.index).mean()
-
-majority_results1 = pd.read_csv("majority_results/majority_results1.csv")
-majority_results2 = pd.read_csv("majority_results/majority_results2.csv")
-majority_results3 = pd.read_csv("majority_results/majority_results3.csv")
-majority_results4 = pd.read_csv("majority_results/majority_results4.csv")
-majority_results5 = pd.read_csv("majority_results/majority_results5.csv")
-
-majority_results_total = pd.concat([majority_results1, majority_results2, majority_results3, majority_results4,
-                                    majority_results5])
-majority_results_mean = majority_results_total.groupby(majority_results_total.index).mean()
-
-learning_results1 = pd.read_csv("learning_results/learning_results1.csv")
-learning_results2 = pd.read_csv("learning_results/learning_results2.csv")
-learning_results3 = pd.read_csv("learning_results/learning_results3.csv")
-learning_results4 = pd.read_csv("learning_results/learning_results4.csv")
-learning_results5 = pd.read_csv("learning_results/learning_results5.csv")
-learning_results6 = pd.read_csv("learning_results/learning_results6.csv")
-
-learning_results_total = pd.concat([learning_results1, learning_results2, learning_results3, learning_results4,
-                                    learning_results5])
-learning_results_mean = learning_results_total.groupby(learning_results_total.index).mean()
-
-# plotting each model with each other for each metric
-average_social_experience = pd.DataFrame(data={'Time Step': learning_results_mean["0"],
-                                               'Random': random_results_mean["0.0"].rolling(window=10).mean(),
-                                               'Selfish': basic_results_mean["0.0"].rolling(window=10).mean(),
-                                               'Majority': majority_results_mean["0.0"].rolling(window=10).mean(),
-                                               'SIPA': learning_results_mean["0.0"].rolling(window=10).mean()},
-                                         columns=['Time Step', 'Random', 'Selfish', 'Majority', 'SIPA'])
-
-max_social_experience = pd.DataFrame(data={'Time Step': learning_results_mean["0"],
-                                           'Random': random_results_mean["0.0.1"].rolling(window=10).mean(),
-                                           'Selfish': basic_results_mean["0.0.1"].rolling(window=10).mean(),
-                                           'Majority': majority_results_mean["0.0.1"].rolling(window=10).mean(),
-                                           'SIPA': learning_results6["0.0.1"].rolling(window=10).mean()},
-                                     columns=['Time Step', 'Random', 'Selfish', 'Majority', 'SIPA'])
-
-min_social_experience = pd.DataFrame(data={'Time Step': learning_results_mean["0"],
-                                           'Random': random_results_mean["0.0.2"].rolling(window=10).mean(),
-                                           'Selfish': basic_results_mean["0.0.2"].rolling(window=10).mean(),
-                                           'Majority': majority_results_mean["0.0.2"].rolling(window=10).mean(),
-                                           'SIPA': learning_results_mean["0.0.2"].rolling(window=10).mean()},
-                                     columns=['Time Step', 'Random', 'Selfish', 'Majority', 'SIPA'])
-
-average_reward = pd.DataFrame(data={'Time Step': learning_results_mean["0"],
-                                    'Random': random_results_mean["0.0.3"].rolling(window=10).mean(),
-                                    'Selfish': basic_results_mean["0.0.3"].rolling(window=10).mean(),
-                                    'Majority': majority_results_mean["0.0.3"].rolling(window=10).mean(),
-                                    'SIPA': learning_results_mean["0.0.3"].rolling(window=10).mean()},
-                              columns=['Time Step', 'Random', 'Selfish', 'Majority', 'SIPA'])
-
-below_average = pd.DataFrame(data={'Time Step': learning_results_mean["0"],
-                                   'Random': random_results_mean["0.0.4"].rolling(window=10).mean(),
-                                   'Selfish': basic_results_mean["0.0.4"].rolling(window=10).mean(),
-                                   'Majority': majority_results_mean["0.0.4"].rolling(window=10).mean(),
-                                   'SIPA': learning_results_mean["0.0.4"].rolling(window=10).mean()},
-                             columns=['Time Step', 'Random', 'Selfish', 'Majority', 'SIPA'])
-
-# filter after 50 time steps
-drop_list = []
-for i in range(51):
-    drop_list.append(i)
-
-random_results_mean = random_results_mean.drop(drop_list)
-basic_results_mean = basic_results_mean.drop(drop_list)
-majority_results_mean = majority_results_mean.drop(drop_list)
-learning_results_mean = learning_results_mean.drop(drop_list)
-
-
-test1 = ttest_rel(learning_results_mean["0.0"], majority_results_mean["0.0"], alternative='greater')
-test2 = ttest_rel(learning_results_mean["0.0.1"], majority_results_mean["0.0.1"], alternative='greater')
-test3 = ttest_rel(learning_results_mean["0.0.2"], majority_results_mean["0.0.2"], alternative='greater')
-test4 = ttest_rel(learning_results_mean["0.0.3"], majority_results_mean["0.0.3"], alternative='greater')
-test5 = ttest_rel(learning_results_mean["0.0.4"], majority_results_mean["0.0.4"], alternative='less')
-
-average_social_experience.plot(x="Time Step", ylabel="Social Experience");
-max_social_experience.plot(x="Time Step", ylabel="Social Experience");
-min_social_experience.plot(x="Time Step", ylabel="Social Experience");
-average_reward.plot(x="Time Step", ylabel="Reward (Sanctions) Received");
-below_average.plot(x="Time Step", ylabel="Number of Agents with Social Experience Lower Than Average")
-
-indiv_basic_results1 = pd.read_csv("individual_results/basic_inidividual_results2.csv")
-indiv_basic_results2 = pd.read_csv("individual_results/basic_inidividual_results3.csv")
-indiv_basic_results2 = indiv_basic_results2.iloc[1:, :]
-indiv_basic_results3 = pd.read_csv("individual_results/basic_inidividual_results4.csv")
-indiv_basic_results3 = indiv_basic_results3.iloc[1:, :]
-indiv_basic = pd.concat([indiv_basic_results1, indiv_basic_results2, indiv_basic_results3])
-indiv_basic_mean = indiv_basic.mean(axis=0)
-indiv_basic_mean.pop('0')
-
-indiv_learning_results1 = pd.read_csv("individual_results/learning_inidividual_results2.csv")
-indiv_learning_results2 = pd.read_csv("individual_results/learning_inidividual_results3.csv")
-indiv_learning_results2 = indiv_learning_results2.iloc[1:, :]
-indiv_learning_results3 = pd.read_csv("individual_results/learning_inidividual_results4.csv")
-indiv_learning_results3 = indiv_learning_results3.iloc[1:, :]
-indiv_learning = pd.concat([indiv_learning_results1, indiv_learning_results2, indiv_learning_results3])
-indiv_learning_mean = indiv_learning.mean(axis=0)
-indiv_learning_mean.pop('0')
-
-indiv_majority_results1 = pd.read_csv("individual_results/majority_inidividual_results2.csv")
-indiv_majority_results2 = pd.read_csv("individual_results/majority_inidividual_results3.csv")
-indiv_majority_results2 = indiv_majority_results2.iloc[1:, :]
-indiv_majority_results3 = pd.read_csv("individual_results/majority_inidividual_results4.csv")
-indiv_majority_results3 = indiv_majority_results3.iloc[1:, :]
-indiv_majority = pd.concat([indiv_majority_results1, indiv_majority_results2, indiv_majority_results3])
-indiv_majority_mean = indiv_majority.mean(axis=0)
-indiv_majority_mean.pop('0')
-
-indiv_random_results1 = pd.read_csv("individual_results/random_inidividual_results2.csv")
-indiv_random_results2 = pd.read_csv("individual_results/random_inidividual_results3.csv")
-indiv_random_results2 = indiv_random_results2.iloc[1:, :]
-indiv_random_results3 = pd.read_csv("individual_results/random_inidividual_results4.csv")
-indiv_random_results3 = indiv_random_results3.iloc[1:, :]
-indiv_random = pd.concat([indiv_random_results1, indiv_random_results2, indiv_random_results3])
-indiv_random_mean = indiv_random.mean(axis=0)
-indiv_random_mean.pop('0')
-
-print(indiv_random_mean)
-
-indiv_violin = pd.DataFrame(data={'Random': indiv_random_mean,
-                                  'Selfish': indiv_basic_mean,
-                                  'Majority': indiv_majority_mean,
-                                  'SIPA': indiv_learning_mean},
-                            columns=['Random', 'Selfish', 'Majority', 'SIPA'])
-sns.set_theme(style="whitegrid")
-ax = sns.violinplot(data=indiv_violin)
-
-plt.show()
-
-
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregate import aggregate_store
+from storage import METRICS, ReplicateStore, read_run, run_metrics
+
+# Every model's replicates are aggregated from memory-mapped (replicate, step, metric) stores kept in this directory,
+# built from all the *_resultsN.csv files and .npz runs found, and streamed one replicate at a time through a one-pass
+# aggregate, so results never all have to be loaded into memory
+STORE_DIRECTORY = 'store'
+
+# Name of each model in the plots, and the prefix of its results files
+MODELS = {'Random': 'random', 'Selfish': 'basic', 'Majority': 'majority', 'SIPA': 'learning'}
+
+# The individual results used for the violin plot are the runs that share the same spread of privacy types
+INDIVIDUAL_REPLICATES = ['2', '3', '4']
+
+NUM_OF_AGENTS = 20
+
+# Name of the agent class of each model, as saved in the configuration of .npz runs
+AGENT_CLASSES = {'random': 'RandomAgent', 'basic': 'BasicAgent', 'majority': 'MajorityAgent',
+                 'learning': 'EpsilonAgent'}
+# How the legacy runs were made, .npz runs are only averaged with them if they were made the same way. Their seed, steps
+# and what was collected when may differ, any other parameter (e.g. snapshot_history) rules a run out
+LEGACY_CONFIG = {'N': NUM_OF_AGENTS, 'num_of_friends': 8, 'rewire': 0.3, 'privacy_population': 2}
+FREE_PARAMETERS = ('agent', 'seed', 'steps', 'collect', 'burn_in', 'stop', 'converged_at')
+
+# This SIPA run is not part of the SIPA averages, it is plotted on its own as SIPA's max happiness like in the
+# published figures
+SIPA_MAX_RUN = 'learning_results/learning_results6.csv'
+
+
+def replicate_number(path):
+    number = re.search(r'(\d*)\.(csv|npz)$', path).group(1)
+    return int(number) if number else 0
+
+
+# Whether a .npz run of a model was made like the legacy runs, see LEGACY_CONFIG
+def comparable(model, config):
+    return (config.get('agent') in (model, AGENT_CLASSES[model]) and
+            all(config.get(name) == value for name, value in LEGACY_CONFIG.items()) and
+            set(config) <= set(LEGACY_CONFIG) | set(FREE_PARAMETERS))
+
+
+# Whether a results file belongs in a model's store, only the configuration of .npz runs is read
+def included(model, path):
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return comparable(model, json.loads(data['metadata'].item()))
+    return path != SIPA_MAX_RUN
+
+
+# Replicates of the results files of a model that are not in its store yet, as (path, replicate) read one at a time
+# (legacy .csv files hold one row per step: the step followed by the METRICS, .npz runs are written by model.py and have
+# as many steps as their configuration ran for). Files that are not included are left out with a note
+def new_replicates(model, sources):
+    paths = sorted(glob.glob(model + '_results/' + model + '_results*.csv'), key=replicate_number)
+    for path in paths + sorted(glob.glob(model + '_*results.npz')):
+        if path in sources:
+            continue
+        if not included(model, path):
+            if path != SIPA_MAX_RUN:
+                print('Leaving out ' + path + ', it was not run like the legacy ' + model + ' runs')
+            continue
+        if path.endswith('.csv'):
+            yield path, pd.read_csv(path, header=None).values[:, 1:]
+        else:
+            arrays, config = read_run(path)
+            yield path, run_metrics(arrays, config.get('steps'))
+
+
+# Adds every results file of a model that is not in its store yet. A new store starts with as many steps as its first
+# replicate and is lengthened for longer ones. A store holding a file that is no longer included is built again
+def update_store(model):
+    directory = os.path.join(STORE_DIRECTORY, model)
+    store = ReplicateStore(directory, mode='r+') if os.path.exists(os.path.join(directory, 'store.json')) else None
+    if store is not None and not all(included(model, path) for path in store.sources):
+        del store
+        shutil.rmtree(directory)
+        store = None
+    for path, replicate in new_replicates(model, store.sources if store is not None else []):
+        if store is None:
+            store = ReplicateStore.create(directory, METRICS, len(replicate))
+        store.append(replicate, path)
+    if store is None:
+        store = ReplicateStore.create(directory, METRICS, 0)
+    return store
+
+
+# Same for the per-agent happiness of the individual results (first row: privacy types, then one row per step)
+def update_individual_store(model):
+    directory = os.path.join(STORE_DIRECTORY, model + '_individual')
+    store = ReplicateStore(directory, mode='r+') if os.path.exists(os.path.join(directory, 'store.json')) else None
+    for number in INDIVIDUAL_REPLICATES:
+        path = 'individual_results/' + model + '_inidividual_results' + number + '.csv'
+        if store is None or path not in store.sources:
+            replicate = pd.read_csv(path, header=None).values[1:, 1:]
+            if store is None:
+                store = ReplicateStore.create(directory, ['agent ' + str(i) for i in range(NUM_OF_AGENTS)],
+                                              len(replicate))
+            store.append(replicate, path)
+    return store
+
+
+# Rolling mean of one metric of every model
+def metric_over_time(means, metric, window=10):
+    column = METRICS.index(metric)
+    steps = max(len(mean) for mean in means.values())
+    return pd.DataFrame(data=dict({'Time Step': np.arange(steps)},
+                                  **{name: pd.Series(means[name][:, column]).rolling(window=window).mean()
+                                     for name in MODELS}),
+                        columns=['Time Step'] + list(MODELS))
+
+
+if __name__ == '__main__':
+    plt.close("all")
+
+    # PLOTTING
+
+    # The averages of the results for each model
+    means = {name: aggregate_store(update_store(model)).mean for name, model in MODELS.items()}
+
+    # plotting each model with each other for each metric
+    average_social_experience = metric_over_time(means, 'Average_Happiness')
+    max_social_experience = metric_over_time(means, 'Max_Happiness')
+    min_social_experience = metric_over_time(means, 'Min_Happiness')
+    average_reward = metric_over_time(means, 'Average_Reward')
+    below_average = metric_over_time(means, 'Below_Average')
+    sipa_max = pd.read_csv(SIPA_MAX_RUN, header=None).values[:, 1 + METRICS.index('Max_Happiness')]
+    max_social_experience['SIPA'] = pd.Series(sipa_max).rolling(window=10).mean()
+
+    # filter after 50 time steps (steps 0-51 are dropped, as in the published t-tests)
+    after_exploring = slice(52, None)
+    learning_mean = means['SIPA'][after_exploring]
+    majority_mean = means['Majority'][after_exploring]
+
+    test1 = ttest_rel(learning_mean[:, 0], majority_mean[:, 0], alternative='greater')
+    test2 = ttest_rel(learning_mean[:, 1], majority_mean[:, 1], alternative='greater')
+    test3 = ttest_rel(learning_mean[:, 2], majority_mean[:, 2], alternative='greater')
+    test4 = ttest_rel(learning_mean[:, 3], majority_mean[:, 3], alternative='greater')
+    test5 = ttest_rel(learning_mean[:, 4], majority_mean[:, 4], alternative='less')
+
+    average_social_experience.plot(x="Time Step", ylabel="Social Experience");
+    max_social_experience.plot(x="Time Step", ylabel="Social Experience");
+    min_social_experience.plot(x="Time Step", ylabel="Social Experience");
+    average_reward.plot(x="Time Step", ylabel="Reward (Sanctions) Received");
+    below_average.plot(x="Time Step", ylabel="Number of Agents with Social Experience Lower Than Average")
+
+    # Average happiness of each agent over every step of every replicate
+    indiv_means = {name: np.nanmean(aggregate_store(update_individual_store(model)).mean, axis=0)
+                   for name, model in MODELS.items()}
+
+    print(indiv_means['Random'])
+
+    indiv_violin = pd.DataFrame(data=indiv_means, columns=list(MODELS))
+    sns.set_theme(style="whitegrid")
+    ax = sns.violinplot(data=indiv_violin)
+
+    plt.show()
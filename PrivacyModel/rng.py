@@ -0,0 +1,90 @@
+# Counter-based random streams. Every draw is a pure function of (seed, agent, step, purpose): the counter
+# (agent, step, purpose, 0) is encrypted with the Philox4x64-10 block cipher keyed by the seed, and the first 64-bit
+# word of the block becomes a uniform in [0, 1) the way NumPy's Generator.random() makes one. Nothing is consumed in
+# order, so the agents' draws are the same whichever order they are activated in, whichever engine runs them and
+# however the population is split between processes.
+#
+# The cipher is written with NumPy uint64 array operations (the 64 x 64 -> 128 bit multiplies are done in 32-bit
+# halves), so a whole population's draws for a step are computed without a Python loop over the agents. Its output is
+# exactly that of NumPy's own Philox bit generator (and of Random123's known-answer tests): the draw of an agent is the
+# first random() of a Generator(Philox(key=[seed, 0])) whose counter is set to one before [agent, step, purpose, 0].
+
+import numpy as np
+
+# The third counter word of each kind of draw, privacy and place are the draws made when the population is created
+PURPOSES = {'privacy': 0, 'place': 1, 'order': 2, 'move': 3, 'action': 4, 'explore': 5}
+# Draws are computed this many at a time, so the cipher's intermediate arrays stay in cache (about 3x faster than the
+# whole population at once for 10^6 agents)
+CHUNK = 2 ** 14
+
+PHILOX_ROUNDS = 10
+PHILOX_M0 = np.uint64(0xD2E7470EE14C6C93)
+PHILOX_M1 = np.uint64(0xCA5A826395121157)
+PHILOX_W0 = np.uint64(0x9E3779B97F4A7C15)
+PHILOX_W1 = np.uint64(0xBB67AE8584CAA73B)
+LOW_32 = np.uint64(0xFFFFFFFF)
+SHIFT_32 = np.uint64(32)
+SHIFT_11 = np.uint64(11)
+
+
+# High and low 64-bit words of the 128-bit products a * b, for uint64 arrays
+def mulhilo(a, b):
+    a0, a1 = a & LOW_32, a >> SHIFT_32
+    b0, b1 = b & LOW_32, b >> SHIFT_32
+    cross0 = a0 * b1
+    cross1 = a1 * b0
+    middle = ((a0 * b0) >> SHIFT_32) + (cross0 & LOW_32) + (cross1 & LOW_32)
+    high = a1 * b1 + (cross0 >> SHIFT_32) + (cross1 >> SHIFT_32) + (middle >> SHIFT_32)
+    return high, a * b
+
+
+# Philox4x64-10 of the counters (x0, x1, x2, x3), uint64 arrays, under the key (k0, k1), returns the four words of the
+# encrypted blocks
+def philox4x64(x0, x1, x2, x3, k0, k1):
+    k0, k1 = np.uint64(k0), np.uint64(k1)
+    with np.errstate(over='ignore'):
+        for i in range(PHILOX_ROUNDS):
+            if i:
+                k0 = k0 + PHILOX_W0
+                k1 = k1 + PHILOX_W1
+            high0, low0 = mulhilo(PHILOX_M0, x0)
+            high1, low1 = mulhilo(PHILOX_M1, x2)
+            x0, x1, x2, x3 = high1 ^ x1 ^ k0, low1, high0 ^ x3 ^ k1, low0
+    return x0, x1, x2, x3
+
+
+class CounterStreams:
+    """Uniform draws keyed by (seed, agent, step, purpose), see the module comment."""
+
+    # Without a seed one is drawn from the OS's entropy (128 bits, which the key holds whole), and kept in self.seed so
+    # the run can be repeated
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.key = (seed % 2 ** 64, (seed // 2 ** 64) % 2 ** 64)
+        # purpose -> (step, draws of every agent as a list), for models that read the draws one agent at a time
+        self.cache = {}
+
+    # Draws of the agents (an array of unique_ids) for purpose at step
+    def uniforms(self, purpose, step, agents):
+        agents = np.asarray(agents, dtype=np.uint64)
+        draws = np.empty(len(agents))
+        for start in range(0, len(agents), CHUNK):
+            chunk = agents[start:start + CHUNK]
+            x0, x1, x2, x3 = philox4x64(chunk, np.full(len(chunk), step, dtype=np.uint64),
+                                        np.full(len(chunk), PURPOSES[purpose], dtype=np.uint64),
+                                        np.zeros(len(chunk), dtype=np.uint64), *self.key)
+            draws[start:start + CHUNK] = (x0 >> SHIFT_11) * (1.0 / 2 ** 53)
+        return draws
+
+    # Draw of one agent out of a population of n, computed for the whole population once per (purpose, step)
+    def uniform(self, purpose, step, agent, n):
+        cached = self.cache.get(purpose)
+        if cached is None or cached[0] != step:
+            cached = self.cache[purpose] = (step, self.uniforms(purpose, step, np.arange(n)).tolist())
+        return cached[1][agent]
+
+    # Order the n agents are activated in at step, a random permutation that does not depend on how it is computed
+    def order(self, step, n):
+        return np.argsort(self.uniforms('order', step, np.arange(n)), kind='stable')
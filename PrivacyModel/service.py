@@ -0,0 +1,251 @@
+# Local job service. Runs and sweeps are submitted as JSON over HTTP on localhost, queued, and run on a bounded pool of
+# worker processes; each finished run is saved as a .npz results file (see storage.py) that the service serves back.
+#
+#   python service.py --workers 4 --output results/service
+#
+#   POST /jobs                    {"run": {"agent": "learning", "N": 200, "seed": 1}}
+#                                 or {"sweep": {"agent": ["basic", "majority"], "seed": [1, 2, 3]}} (a grid or a list
+#                                 of configurations, parameters as in sweep.py)
+#   GET  /jobs                    every job with its status and progress
+#   GET  /jobs/<id>               one job, with the configuration and results file of each of its runs
+#   GET  /jobs/<id>/files/<name>  a results file
+#   DELETE /jobs/<id>             cancels the runs of a job that have not started
+#
+# Jobs are saved in the output directory, so when the service is started again unfinished jobs carry on from the runs
+# that have no results yet.
+
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from storage import write_run
+from sweep import complete_config, config_key, expand_grid, run_config
+
+
+# Runs in the worker process, only the name of the results file is sent back. Results are written to a temporary file
+# first so an interrupted write is never mistaken for a finished run
+def run_and_save(config, path):
+    write_run(path + '.tmp.npz', run_config(config))
+    os.replace(path + '.tmp.npz', path)
+    return os.path.basename(path)
+
+
+class Job:
+    """The runs of one submitted run or sweep, and how far along they are."""
+
+    def __init__(self, job_id, configs, directory, submitted=None):
+        self.id = job_id
+        self.configs = configs
+        self.directory = directory
+        self.submitted = submitted or time.time()
+        # Per run: None while waiting or running, then 'done', 'failed' or 'cancelled'
+        self.outcomes = [None] * len(configs)
+        self.errors = {}
+        self.futures = {}
+
+    def fileName(self, index):
+        return config_key(self.configs[index]) + '.npz'
+
+    @property
+    def status(self):
+        if all(outcome is not None for outcome in self.outcomes):
+            if 'failed' in self.outcomes:
+                return 'failed'
+            return 'cancelled' if 'cancelled' in self.outcomes else 'done'
+        return 'running' if any(future.running() for future in self.futures.values()) else 'queued'
+
+    def summary(self):
+        return {'id': self.id, 'status': self.status, 'submitted': self.submitted, 'runs': len(self.configs),
+                'done': self.outcomes.count('done'), 'failed': self.outcomes.count('failed'),
+                'cancelled': self.outcomes.count('cancelled')}
+
+    def details(self):
+        runs = [{'config': config, 'status': self.outcomes[i] or ('running' if i in self.futures and
+                                                                self.futures[i].running() else 'queued'),
+                 'file': self.fileName(i) if self.outcomes[i] == 'done' else None,
+                 'error': self.errors.get(i)} for i, config in enumerate(self.configs)]
+        return dict(self.summary(), runs=runs)
+
+    # Saved like sweep results, written to a temporary file first so an interrupted write never leaves a broken file
+    def save(self):
+        path = os.path.join(self.directory, 'job.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'id': self.id, 'submitted': self.submitted, 'configs': self.configs,
+                       'outcomes': self.outcomes, 'errors': self.errors}, file)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'job.json')) as file:
+            saved = json.load(file)
+        job = cls(saved['id'], saved['configs'], directory, saved['submitted'])
+        job.outcomes = saved['outcomes']
+        job.errors = {int(i): error for i, error in saved['errors'].items()}
+        return job
+
+
+class JobService:
+    """Queue of jobs run on a pool of workers processes, keeping their results in directory."""
+
+    def __init__(self, directory, workers=None):
+        self.directory = directory
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Workers are spawned rather than forked from the server, which has threads
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                            mp_context=multiprocessing.get_context('spawn'))
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory), key=lambda name: os.path.getmtime(os.path.join(directory, name))):
+            if os.path.exists(os.path.join(directory, name, 'job.json')):
+                self.resume(Job.load(os.path.join(directory, name)))
+
+    # Checks a {"run": config} or {"sweep": grid or list of configs} spec and queues its runs, raises ValueError if it
+    # is not valid
+    def submit(self, spec):
+        if not isinstance(spec, dict) or len(spec) != 1 or not set(spec) <= {'run', 'sweep'}:
+            raise ValueError('A job is {"run": configuration} or {"sweep": grid or list of configurations}')
+        if 'run' in spec:
+            configs = [spec['run']]
+        elif isinstance(spec['sweep'], list):
+            configs = spec['sweep']
+        elif isinstance(spec['sweep'], dict):
+            configs = expand_grid(spec['sweep'])
+        else:
+            raise ValueError('A sweep is a grid (a JSON object) or a list of configurations')
+        if not configs or not all(isinstance(config, dict) for config in configs):
+            raise ValueError('A job needs at least one configuration, each a JSON object')
+        configs = [complete_config(config) for config in configs]
+
+        job_id = uuid.uuid4().hex[:12]
+        job = Job(job_id, configs, os.path.join(self.directory, job_id))
+        os.makedirs(job.directory)
+        job.save()
+        self.resume(job)
+        return job
+
+    # Queues every run of a job that has not finished. The callbacks are only added once the lock is released, as a
+    # callback of a run that has already finished is called straight away and takes the lock itself
+    def resume(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            for i, outcome in enumerate(job.outcomes):
+                if outcome is None:
+                    if os.path.exists(os.path.join(job.directory, job.fileName(i))):
+                        job.outcomes[i] = 'done'
+                        continue
+                    job.futures[i] = self.executor.submit(run_and_save, job.configs[i],
+                                                          os.path.join(job.directory, job.fileName(i)))
+            futures = list(job.futures.items())
+            job.save()
+        for i, future in futures:
+            future.add_done_callback(lambda future, job=job, i=i: self.finished(job, i, future))
+
+    def finished(self, job, i, future):
+        with self.lock:
+            if future.cancelled():
+                job.outcomes[i] = 'cancelled'
+            elif future.exception() is not None:
+                job.outcomes[i] = 'failed'
+                job.errors[i] = repr(future.exception())
+            else:
+                job.outcomes[i] = 'done'
+            del job.futures[i]
+            job.save()
+
+    # Cancels the runs of a job that have not started, returns how many were
+    def cancel(self, job):
+        return sum(future.cancel() for future in list(job.futures.values()))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """HTTP interface of the JobService in self.server.service."""
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        service = self.server.service
+        if parts == ['jobs']:
+            with service.lock:
+                self.reply(200, [job.summary() for job in service.jobs.values()])
+        elif len(parts) == 2 and parts[0] == 'jobs' and parts[1] in service.jobs:
+            with service.lock:
+                self.reply(200, service.jobs[parts[1]].details())
+        elif len(parts) == 4 and parts[0] == 'jobs' and parts[1] in service.jobs and parts[2] == 'files':
+            job = service.jobs[parts[1]]
+            # Only the results files of the job's finished runs are served
+            names = {job.fileName(i) for i, outcome in enumerate(job.outcomes) if outcome == 'done'}
+            if parts[3] not in names:
+                self.reply(404, {'error': 'No results file ' + parts[3] + ' in job ' + job.id})
+                return
+            with open(os.path.join(job.directory, parts[3]), 'rb') as file:
+                content = file.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path.strip('/') != 'jobs':
+            self.reply(404, {'error': 'Not found'})
+            return
+        try:
+            spec = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            job = self.server.service.submit(spec)
+        except ValueError as error:
+            self.reply(400, {'error': str(error)})
+            return
+        with self.server.service.lock:
+            self.reply(201, job.summary())
+
+    def do_DELETE(self):
+        parts = self.path.strip('/').split('/')
+        service = self.server.service
+        if len(parts) == 2 and parts[0] == 'jobs' and parts[1] in service.jobs:
+            self.reply(200, {'cancelled': service.cancel(service.jobs[parts[1]])})
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def reply(self, code, body):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+# The service's HTTP server on localhost, serve_forever() to start it
+def make_server(service, port=8765):
+    server = ThreadingHTTPServer(('127.0.0.1', port), JobHandler)
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a queue of simulation runs and sweeps on localhost.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help='number of runs at a time, by default one per core')
+    parser.add_argument('--output', default='results/service', help='directory jobs and their results are kept in')
+    args = parser.parse_args()
+
+    service = JobService(args.output, args.workers)
+    server = make_server(service, args.port)
+    print('serving on http://127.0.0.1:' + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
@@ -0,0 +1,390 @@
+# One large population simulated by several worker processes. The agents are split into contiguous ranges of unique_id,
+# one shard per worker, which keeps the Watts-Strogatz ring's lattice friendships inside a shard (apart from those at
+# the ends of the ranges), so only rewired friendships cross between shards. Each worker runs VectorizedPrivacyModel's
+# synchronous step on its own agents, with a halo of copies of the friends it has in other shards. Every step the
+# workers swap only those boundary values: positions and happiness at the start of the step, then the actions chosen
+# in the step (twice for the majority policy, before and after the vote).
+# A coordinator tells the workers to step and merges their per-step metrics.
+#
+# Everything goes through a Transport, one end of a two-way message channel. Here they are multiprocessing pipes
+# between processes on one host, another Transport (e.g. over sockets) would let the same shards span machines.
+#
+#   with ShardedPrivacyModel('basic', 10 ** 6, 8, 0.3, shards=4) as model_inst:
+#       for i in range(100):
+#           model_inst.step()
+#       metrics = model_inst.metrics()
+
+import argparse
+import multiprocessing
+import os
+import time
+import traceback
+
+import numpy as np
+
+from agents import AgentConstants
+from graph import relationship_graph
+from mobility import PlaceDistribution, place_distribution
+from storage import METRICS
+from rng import CounterStreams
+from vectorized import (companion_rewards, counter_population, initial_population, majority_actions, own_actions,
+                        resolve_policy)
+
+# Spawn key of the shards' random streams
+SHARD_STREAM = 2
+
+
+class Transport:
+    """One end of a two-way message channel."""
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def recv(self):
+        raise NotImplementedError
+
+    # True if a message can be received within timeout seconds
+    def poll(self, timeout=0):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PipeTransport(Transport):
+    """Transport over a multiprocessing pipe, between processes on the same host."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    # Both ends of a new pipe
+    @classmethod
+    def pair(cls):
+        one, other = multiprocessing.Pipe()
+        return cls(one), cls(other)
+
+    def send(self, message):
+        self.connection.send(message)
+
+    def recv(self):
+        return self.connection.recv()
+
+    def poll(self, timeout=0):
+        return self.connection.poll(timeout)
+
+    def close(self):
+        self.connection.close()
+
+
+# Splits agents 0..N-1 into shards contiguous ranges of (nearly) equal size, shard i has bounds[i]..bounds[i + 1] - 1
+def partition(N, shards):
+    return np.linspace(0, N, shards + 1).round().astype(np.int64)
+
+
+# What each shard needs to know about the graph: its friendships with friends relabelled as local indices (its own
+# agents first, then its halo) and which values it sends to, and receives from, every other shard
+def shard_specs(graph, bounds):
+    shards = len(bounds) - 1
+    specs = []
+    halos = []
+    for shard in range(shards):
+        lo, hi = bounds[shard], bounds[shard + 1]
+        indptr = graph.indptr[lo:hi + 1] - graph.indptr[lo]
+        friends = graph.indices[graph.indptr[lo]:graph.indptr[hi]].astype(np.int64)
+        outside = (friends < lo) | (friends >= hi)
+        halo = np.unique(friends[outside])
+        local = friends - lo
+        local[outside] = (hi - lo) + np.searchsorted(halo, friends[outside])
+        halos.append(halo)
+        specs.append({'shard': shard, 'lo': int(lo), 'hi': int(hi), 'friendsPtr': indptr, 'friends': local,
+                      'receive': {}, 'send': {}})
+
+    for shard, halo in enumerate(halos):
+        owner = np.searchsorted(bounds, halo, side='right') - 1
+        for peer in np.unique(owner).tolist():
+            # Halo copies of the peer's agents, both sides list them in ascending unique_id
+            specs[shard]['receive'][peer] = (bounds[shard + 1] - bounds[shard]) + np.flatnonzero(owner == peer)
+            specs[peer]['send'][shard] = halo[owner == peer] - bounds[peer]
+    return specs
+
+
+class Shard:
+    """The agents of one shard plus the halo of their friends in other shards, as arrays of (own agents + halo)."""
+
+    def __init__(self, spec, peers):
+        self.__dict__.update(spec)
+        self.peers = peers
+        self.size = self.hi - self.lo
+        halo = sum(len(positions) for positions in self.receive.values())
+        self.friendsOf = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(self.friendsPtr))
+
+        self.timeStep = 0
+        if self.counterRng:
+            # Each shard only draws for its own agents, the same draws as any other split of the population
+            self.streams = CounterStreams(self.seed)
+            self.privacyType, pos = counter_population(np.arange(self.lo, self.hi), self.privacyPopulation,
+                                                       self.streams)
+        else:
+            if self.identical:
+                self.rng = np.random.default_rng(self.seed)
+            else:
+                self.rng = np.random.default_rng(np.random.SeedSequence(self.seed,
+                                                                        spawn_key=(SHARD_STREAM, self.shard)))
+            # Every shard draws the same whole population and keeps its own part
+            privacy_type, pos = initial_population(self.N, self.privacyPopulation,
+                                                   self.rng if self.identical else np.random.default_rng(self.seed))
+            self.privacyType = privacy_type[self.lo:self.hi]
+            pos = pos[self.lo:self.hi]
+        self.pos = np.concatenate([pos, np.zeros(halo, dtype=np.int8)])
+        self.currentAction = np.full(self.size + halo, AgentConstants.SHARE_NO, dtype=np.int8)
+        self.happy = np.zeros(self.size + halo)
+        self.reward = np.zeros(self.size)
+
+    # Uniform draws for the shard's agents, with identical all the population's are drawn (the same ones as
+    # VectorizedPrivacyModel's) and the shard's are kept
+    def draws(self, purpose):
+        if self.counterRng:
+            return self.streams.uniforms(purpose, self.timeStep, np.arange(self.lo, self.hi))
+        if self.identical:
+            return self.rng.random(self.N)[self.lo:self.hi]
+        return self.rng.random(self.size)
+
+    # Sends the shard's boundary values of fields to the shards that have them in their halo, and fills in its own halo.
+    # Pairs of shards swap in ascending order of (lower shard, higher shard), the lower one sending first, so no two
+    # shards ever wait on each other whatever the size of the messages
+    def exchange(self, fields):
+        for peer in sorted(set(self.send) | set(self.receive)):
+            if self.shard < peer:
+                self.sendTo(peer, fields)
+                self.receiveFrom(peer, fields)
+            else:
+                self.receiveFrom(peer, fields)
+                self.sendTo(peer, fields)
+
+    def sendTo(self, peer, fields):
+        if peer in self.send:
+            self.peers[peer].send([getattr(self, field)[self.send[peer]] for field in fields])
+
+    def receiveFrom(self, peer, fields):
+        if peer in self.receive:
+            for field, values in zip(fields, self.peers[peer].recv()):
+                getattr(self, field)[self.receive[peer]] = values
+
+    # Synchronous step of VectorizedPrivacyModel on the shard, returns the sums, min and max the coordinator's metrics
+    # are made from
+    def step(self):
+        n = self.size
+        # Halo happiness is not used by these policies, but kept up to date so the halo mirrors the friends' state
+        self.exchange(('pos', 'happy'))
+
+        values = self.actionValues[self.privacyType, self.pos[:n]]
+        action = own_actions(self.policy, values, self.draws('action') if self.policy == 'random' else None)
+        self.currentAction[:n] = action
+        self.exchange(('currentAction',))
+
+        # Friends that are at the same place as the agent
+        together = self.pos[self.friendsOf] == self.pos[self.friends]
+        owner = self.friendsOf[together]
+        companions = self.friends[together]
+        num_companions = np.bincount(owner, minlength=n)
+
+        if self.policy == 'majority':
+            action = majority_actions(values, action, owner, self.currentAction[companions], num_companions)
+            self.currentAction[:n] = action
+            self.exchange(('currentAction',))
+        self.reward[:] = companion_rewards(owner, self.currentAction[owner], self.currentAction[companions],
+                                           num_companions)
+        self.happy[:n] = values[np.arange(n), action] + self.reward
+        self.pos[:n] = self.mobility.places(self.privacyType, self.draws('move'))
+        self.timeStep += 1
+
+        happy = self.happy[:n]
+        return {'happy': happy.sum(), 'max': happy.max(initial=-np.inf), 'min': happy.min(initial=np.inf),
+                'reward': self.reward.sum()}
+
+    def countBelow(self, mean):
+        return int((self.happy[:self.size] < mean).sum())
+
+    def state(self):
+        return {'privacy': self.privacyType.copy(), 'pos': self.pos[:self.size].copy(),
+                'action': self.currentAction[:self.size].copy(), 'happiness': self.happy[:self.size].copy(),
+                'reward': self.reward.copy()}
+
+
+# Worker process: receives its shard's spec from the coordinator, then runs its commands until told to stop. Replies
+# are ('ok', result) or ('error', traceback)
+def run_shard(control, peers):
+    try:
+        shard = Shard(control.recv(), peers)
+        control.send(('ok', None))
+        while True:
+            command = control.recv()
+            if command == 'step':
+                control.send(('ok', shard.step()))
+                control.send(('ok', shard.countBelow(control.recv())))
+            elif command == 'state':
+                control.send(('ok', shard.state()))
+            elif command == 'stop':
+                break
+    except Exception:
+        control.send(('error', traceback.format_exc()))
+    finally:
+        control.close()
+        for peer in peers.values():
+            peer.close()
+
+
+class ShardedPrivacyModel:
+    """A VectorizedPrivacyModel (synchronous steps) split over shards worker processes.
+
+    Takes the same arguments as VectorizedPrivacyModel plus shards (by default one per core). The shards draw from
+    their own random streams of the seed, so a run is reproducible for a given number of shards; with identical=True
+    every shard draws the random numbers of the whole population and keeps its own, which gives exactly the run of
+    VectorizedPrivacyModel for the seed whatever the number of shards, at the cost of O(N) draws per shard per step.
+    With counter_rng=True every agent's draws are keyed by (seed, agent, step, purpose) instead (see rng.py), so each
+    shard only draws for its own agents and the run is that of VectorizedPrivacyModel(counter_rng=True) whatever the
+    number of shards.
+    """
+
+    def __init__(self, agent_model, N, num_of_friends=6, rewire=0.1, preferences=None, seed=102, privacy_population=2,
+                 mobility=None, relationship=None, shards=None, identical=False, counter_rng=False):
+        self.num_agents = N
+        self.policy = resolve_policy(agent_model)
+        # Every shard must draw from the same counter-based streams, so a missing seed is drawn here once for all of them
+        if seed is None and counter_rng:
+            seed = CounterStreams().seed
+        self.seed = seed
+        self.timeStep = 0
+        self.rows = []
+
+        if preferences is None:
+            action_values = AgentConstants.action_values
+        else:
+            action_values = AgentConstants.build_action_values(preferences)
+        mobility = place_distribution(mobility) or PlaceDistribution.uniform()
+        graph = relationship_graph(relationship, N, num_of_friends, rewire, seed)
+
+        shards = min(shards or os.cpu_count(), N)
+        self.bounds = partition(N, shards)
+        specs = shard_specs(graph, self.bounds)
+
+        # A pipe between every two shards with friendships across them, and one from the coordinator to each shard
+        links = [{} for shard in range(shards)]
+        for shard, spec in enumerate(specs):
+            for peer in spec['receive']:
+                if peer not in links[shard]:
+                    links[shard][peer], links[peer][shard] = PipeTransport.pair()
+        self.controls = []
+        self.workers = []
+        for shard, spec in enumerate(specs):
+            control, worker_control = PipeTransport.pair()
+            worker = multiprocessing.Process(target=run_shard, args=(worker_control, links[shard]), daemon=True)
+            worker.start()
+            worker_control.close()
+            self.controls.append(control)
+            self.workers.append(worker)
+            control.send(dict(spec, N=N, seed=seed, identical=identical, counterRng=counter_rng, policy=self.policy,
+                              privacyPopulation=privacy_population, actionValues=action_values, mobility=mobility))
+        for shard_links in links:
+            for link in shard_links.values():
+                link.close()
+        self.gather()
+
+    # Waits for a reply from every shard, raising the error of any shard that failed (or died)
+    def gather(self):
+        replies = [None] * len(self.controls)
+        pending = set(range(len(self.controls)))
+        while pending:
+            for shard in sorted(pending):
+                if self.controls[shard].poll(0.01):
+                    status, reply = self.controls[shard].recv()
+                    if status == 'error':
+                        self.close()
+                        raise RuntimeError('Shard ' + str(shard) + ' failed:\n' + reply)
+                    replies[shard] = reply
+                    pending.discard(shard)
+                elif not self.workers[shard].is_alive():
+                    self.close()
+                    raise RuntimeError('Shard ' + str(shard) + ' exited with code ' +
+                                       str(self.workers[shard].exitcode))
+        return replies
+
+    def broadcast(self, message):
+        for shard, control in enumerate(self.controls):
+            try:
+                control.send(message)
+            except OSError:
+                self.close()
+                raise RuntimeError('Shard ' + str(shard) + ' is not running')
+
+    # Steps every shard, then merges their metrics. Below_Average needs the mean of the whole population, so it is
+    # counted in a second round once the shards' sums are in
+    def step(self):
+        self.broadcast('step')
+        partials = self.gather()
+        mean = sum(partial['happy'] for partial in partials) / self.num_agents
+        self.broadcast(mean)
+        below = sum(self.gather())
+        self.rows.append([mean,
+                          max(partial['max'] for partial in partials),
+                          min(partial['min'] for partial in partials),
+                          sum(partial['reward'] for partial in partials) / self.num_agents,
+                          below])
+        self.timeStep += 1
+
+    # (steps x METRICS) array of the metrics after every step so far
+    def metrics(self):
+        return np.array(self.rows, dtype=np.float64).reshape(-1, len(METRICS))
+
+    # Per-agent arrays of the whole population (privacy, pos, action, happiness, reward), gathered from the shards
+    def state(self):
+        self.broadcast('state')
+        states = self.gather()
+        return {name: np.concatenate([state[name] for state in states]) for name in states[0]}
+
+    def close(self):
+        for control, worker in zip(self.controls, self.workers):
+            if worker.is_alive():
+                try:
+                    control.send('stop')
+                except OSError:
+                    pass
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for control in self.controls:
+            control.close()
+        self.workers = []
+        self.controls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run one large population split over several worker processes.')
+    parser.add_argument('--agent', choices=['basic', 'random', 'majority'], default='basic')
+    parser.add_argument('-N', type=int, default=10 ** 6, help='number of agents')
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=102)
+    parser.add_argument('--output', default=None, help='.npy file the (steps x metrics) array is saved to')
+    parser.add_argument('--counter-rng', action='store_true',
+                        help='counter-based draws, the same run whatever the number of shards')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ShardedPrivacyModel(args.agent, args.N, 8, 0.3, seed=args.seed, shards=args.shards,
+                             counter_rng=args.counter_rng) as model_inst:
+        print('set up', len(model_inst.bounds) - 1, 'shards in', round(time.perf_counter() - start, 2), 's')
+        start = time.perf_counter()
+        for i in range(args.steps):
+            model_inst.step()
+        print(round(args.steps / (time.perf_counter() - start), 2), 'steps/s')
+        print(dict(zip(METRICS, model_inst.metrics()[-1])))
+        if args.output:
+            np.save(args.output, model_inst.metrics())
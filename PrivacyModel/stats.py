@@ -0,0 +1,65 @@
+# Statistics of the agents' happiness that are kept up to date whenever an agent's happy value changes, so that agents
+# and model reporters can read them without walking the whole population
+
+import numpy as np
+
+
+class PopulationStats:
+    """Sum, min, max and count of the happiness of a population of N agents, indexed by unique_id."""
+
+    def __init__(self, N):
+        self.values = np.zeros(N)
+        self.count = N
+        self.sum = 0.0
+        self._min = 0.0
+        self._max = 0.0
+        # Set when the agent holding the min/max moves away from it, the new one is only looked for when read
+        self._minStale = False
+        self._maxStale = False
+
+    # Called every time an agent's happy value changes
+    def update(self, unique_id, value):
+        old = self.values.item(unique_id)
+        self.values[unique_id] = value
+        self.sum += value - old
+
+        if value <= self._min:
+            self._min = value
+            self._minStale = False
+        elif old == self._min:
+            self._minStale = True
+
+        if value >= self._max:
+            self._max = value
+            self._maxStale = False
+        elif old == self._max:
+            self._maxStale = True
+
+    # Recompute everything from values, for when the whole population was updated at once
+    def refresh(self):
+        self.sum = float(self.values.sum())
+        self._min = float(self.values.min())
+        self._max = float(self.values.max())
+        self._minStale = False
+        self._maxStale = False
+
+    @property
+    def mean(self):
+        return self.sum / self.count
+
+    @property
+    def min(self):
+        if self._minStale:
+            self._min = float(self.values.min())
+            self._minStale = False
+        return self._min
+
+    @property
+    def max(self):
+        if self._maxStale:
+            self._max = float(self.values.max())
+            self._maxStale = False
+        return self._max
+
+    def countBelowMean(self):
+        return int(np.count_nonzero(self.values < self.mean))
@@ -0,0 +1,184 @@
+# Binary results files. A run is saved as a .npz file with one (steps x agents) array per per-agent variable
+# (happiness, privacy type, action and reward) and the run's configuration, including its seed, as JSON metadata.
+# Unlike the old row-by-row .csv files this works for any number of agents and loads straight back into arrays.
+#
+# Replicates of a model are collected in a ReplicateStore, a memory-mapped (replicate, step, metric) array that
+# evaluate.py aggregates one replicate at a time (see aggregate.py) instead of loading every results file into memory.
+
+import json
+import os
+
+import numpy as np
+
+# Per-agent reporter columns of the DataCollector and the array (and type) each is saved as
+RUN_ARRAYS = {'Individual_Happiness': ('happiness', np.float64),
+              'Agent_Privacy': ('privacy', np.int8),
+              'Agent_Action': ('action', np.int8),
+              'Individual_Reward': ('reward', np.float64)}
+
+
+# Stacks a column of per-agent lists (one per step) into a preallocated (steps x agents) array, leaving out the steps
+# it was not collected at (None)
+def stack_column(column, dtype):
+    rows = [row for row in column.values if row is not None]
+    array = np.empty((len(rows), len(rows[0]) if len(rows) else 0), dtype=dtype)
+    for step, row in enumerate(rows):
+        array[step] = row
+    return array
+
+
+# The per-agent arrays of a run's results DataFrame, keyed like read_run's. A variable that was not collected at every
+# step from step 0 also has the time steps of its rows, as '<name>_steps'. Whichever of the model-level METRICS were
+# collected are kept as a (rows x metrics) 'metrics' array of the steps any of them was collected at (with
+# 'metrics_steps' like the others), NaN for the metrics that were not collected then
+def run_arrays(modelDF):
+    arrays = {}
+    for column, (name, dtype) in RUN_ARRAYS.items():
+        if column in modelDF:
+            arrays[name] = stack_column(modelDF[column], dtype)
+            steps = modelDF.index[modelDF[column].notna()].to_numpy()
+            if not np.array_equal(steps, np.arange(len(steps))):
+                arrays[name + '_steps'] = steps
+    collected = [metric for metric in METRICS if metric in modelDF]
+    if collected:
+        metrics = modelDF.reindex(columns=METRICS)[modelDF[collected].notna().any(axis=1)]
+        arrays['metrics'] = metrics.to_numpy(dtype=np.float64)
+        if not np.array_equal(metrics.index.to_numpy(), np.arange(len(metrics))):
+            arrays['metrics_steps'] = metrics.index.to_numpy()
+    return arrays
+
+
+def write_run(path, modelDF, config=None, compress=True):
+    arrays = run_arrays(modelDF)
+    if config is None:
+        config = modelDF.attrs.get('config', {})
+    metadata = dict(config, converged_at=modelDF.attrs.get('converged_at'))
+    save = np.savez_compressed if compress else np.savez
+    save(path, metadata=np.array(json.dumps(metadata)), **arrays)
+
+
+# Returns ({'happiness': array, ...}, config) of a run saved with write_run
+def read_run(path):
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files if name != 'metadata'}
+        config = json.loads(data['metadata'].item())
+    return arrays, config
+
+
+# Model-level metrics of a run, in the column order of the legacy *_resultsN.csv files
+METRICS = ['Average_Happiness', 'Max_Happiness', 'Min_Happiness', 'Average_Reward', 'Below_Average']
+
+
+# Time steps of the rows of one of a run's arrays
+def row_steps(arrays, name):
+    if name + '_steps' in arrays:
+        return arrays[name + '_steps']
+    return np.arange(len(arrays[name]))
+
+
+# Computes the (steps x metrics) array of METRICS from the per-agent arrays of a run, with the metrics collected
+# during the run (if any) in place of the computed ones. Every row is put at the time step it was collected at, steps
+# nothing was collected at are NaN. steps defaults to the last step collected plus one
+def run_metrics(arrays, steps=None):
+    names = [name for name in ('happiness', 'reward', 'metrics') if name in arrays]
+    if steps is None:
+        steps = max((int(row_steps(arrays, name)[-1]) + 1 for name in names if len(arrays[name])), default=0)
+    metrics = np.full((steps, len(METRICS)), np.nan)
+    if 'happiness' in arrays:
+        happiness = arrays['happiness']
+        average = happiness.mean(axis=1)
+        rows = row_steps(arrays, 'happiness')
+        metrics[rows, 0] = average
+        metrics[rows, 1] = happiness.max(axis=1, initial=-np.inf)
+        metrics[rows, 2] = happiness.min(axis=1, initial=np.inf)
+        metrics[rows, 4] = (happiness < average[:, np.newaxis]).sum(axis=1)
+    if 'reward' in arrays:
+        metrics[row_steps(arrays, 'reward'), 3] = arrays['reward'].mean(axis=1)
+    if 'metrics' in arrays:
+        rows = row_steps(arrays, 'metrics')
+        metrics[rows] = np.where(np.isnan(arrays['metrics']), metrics[rows], arrays['metrics'])
+    return metrics
+
+
+class ReplicateStore:
+    """Replicates of one model saved on disk as a single memory-mapped (replicate, step, metric) float array.
+
+    Steps a replicate did not run for (e.g. it stopped early) or collect at are NaN, and the store is lengthened when a
+    replicate runs for more steps than it has. Files the replicates came from are recorded so the store can be topped
+    up with new runs without importing the old ones again.
+    """
+
+    def __init__(self, directory, mode='r'):
+        self.directory = directory
+        with open(os.path.join(directory, 'store.json')) as file:
+            metadata = json.load(file)
+        self.metrics = metadata['metrics']
+        self.count = metadata['count']
+        self.sources = metadata['sources']
+        self.array = np.load(os.path.join(directory, 'replicates.npy'), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, directory, metrics, steps, capacity=16):
+        os.makedirs(directory, exist_ok=True)
+        array = np.lib.format.open_memmap(os.path.join(directory, 'replicates.npy'), mode='w+', dtype=np.float64,
+                                          shape=(capacity, steps, len(metrics)))
+        array[:] = np.nan
+        array.flush()
+        del array
+        cls.writeMetadata(directory, metrics, 0, [])
+        return cls(directory, mode='r+')
+
+    @staticmethod
+    def writeMetadata(directory, metrics, count, sources):
+        with open(os.path.join(directory, 'store.json.tmp'), 'w') as file:
+            json.dump({'metrics': metrics, 'count': count, 'sources': sources}, file)
+        os.replace(os.path.join(directory, 'store.json.tmp'), os.path.join(directory, 'store.json'))
+
+    @property
+    def steps(self):
+        return self.array.shape[1]
+
+    # The stored replicates, a view of the memory map rather than a copy
+    @property
+    def data(self):
+        return self.array[:self.count]
+
+    # Adds a (steps x metrics) replicate, lengthening the store if the replicate has more steps than it
+    def append(self, replicate, source=None):
+        replicate = np.asarray(replicate, dtype=np.float64)
+        if replicate.ndim != 2 or replicate.shape[1] != len(self.metrics):
+            raise ValueError('Replicate of shape ' + str(replicate.shape) + ' does not fit a store of ' +
+                             str(len(self.metrics)) + ' metrics')
+        if self.count == len(self.array) or replicate.shape[0] > self.steps:
+            self.grow(capacity=2 * len(self.array) if self.count == len(self.array) else len(self.array),
+                      steps=max(self.steps, replicate.shape[0]))
+        self.array[self.count, :replicate.shape[0]] = replicate
+        self.array.flush()
+        self.count += 1
+        if source is not None:
+            self.sources.append(source)
+        self.writeMetadata(self.directory, self.metrics, self.count, self.sources)
+
+    # Copies the replicates over to a store of capacity replicates (double by default) of steps steps (the same by
+    # default, new steps are NaN), in chunks so they never all have to be in memory
+    def grow(self, chunk=256, capacity=None, steps=None):
+        path = os.path.join(self.directory, 'replicates.npy')
+        capacity = capacity or 2 * len(self.array)
+        steps = steps or self.steps
+        bigger = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=np.float64,
+                                           shape=(capacity, steps, len(self.metrics)))
+        bigger[len(self.array):] = np.nan
+        bigger[:len(self.array), self.steps:] = np.nan
+        for start in range(0, len(self.array), chunk):
+            end = min(start + chunk, len(self.array))
+            bigger[start:end, :self.steps] = self.array[start:end]
+        bigger.flush()
+        del bigger
+        del self.array
+        os.replace(path + '.tmp', path)
+        self.array = np.load(path, mmap_mode='r+')
+
+    # Replicates one at a time, each read from the memory map only when it is reached
+    def __iter__(self):
+        for replicate in range(self.count):
+            yield self.array[replicate]
@@ -0,0 +1,121 @@
+# Parameter sweeps over the agent model, N, num_of_friends, rewire, privacy_population and seed of run_simulation.
+# A grid (or a list of configurations) is expanded into jobs that run in a process pool, and every finished job's
+# results are saved straight away, as a .npz run (see storage.py) named by a key derived from its configuration, so
+# running an interrupted sweep again only runs the configurations that have no results yet.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import itertools
+import json
+import os
+
+from convergence import criterion_from_spec
+from model import run_simulation
+from replication import AGENT_MODELS
+from storage import read_run, write_run
+
+# Parameters of a configuration and their values when a configuration leaves them out
+DEFAULTS = {'agent': 'basic', 'N': 20, 'num_of_friends': 8, 'rewire': 0.3, 'privacy_population': 2, 'seed': 102,
+            'steps': 200}
+# Parameters that are only part of a configuration (and its key) when given, 'stop' is a stopping criterion spec such as
+# {"criterion": "rolling_variance", "window": 20, "threshold": 0.01}, see convergence.py
+OPTIONAL = ('stop',)
+
+
+# Expands {'parameter': [values], ...} into one configuration for every combination of values
+def expand_grid(grid):
+    names = list(grid)
+    values = [grid[name] if isinstance(grid[name], list) else [grid[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+# Fills in the defaults and checks every parameter is known
+def complete_config(config):
+    unknown = set(config) - set(DEFAULTS) - set(OPTIONAL)
+    if unknown:
+        raise ValueError('Unknown sweep parameters: ' + ', '.join(sorted(unknown)))
+    if config.get('agent', DEFAULTS['agent']) not in AGENT_MODELS:
+        raise ValueError('Unknown agent model ' + str(config['agent']))
+    completed = {name: config.get(name, default) for name, default in DEFAULTS.items()}
+    for name in OPTIONAL:
+        if config.get(name) is not None:
+            completed[name] = config[name]
+    return completed
+
+
+# Key a configuration's results are stored under, the same for equal configurations whatever their parameter order
+def config_key(config):
+    canonical = json.dumps(complete_config(config), sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def result_path(directory, config):
+    return os.path.join(directory, config_key(config) + '.npz')
+
+
+# Runs in the worker process
+def run_config(config):
+    stop = criterion_from_spec(config['stop']) if 'stop' in config else None
+    return run_simulation(config['steps'], AGENT_MODELS[config['agent']], seed=config['seed'], N=config['N'],
+                          num_of_friends=config['num_of_friends'], rewire=config['rewire'],
+                          privacy_population=config['privacy_population'], stop=stop)
+
+
+# Saves a finished configuration, results are written to a temporary file first so an interrupted write is never
+# mistaken for a finished job
+def save_result(directory, config, modelDF):
+    path = result_path(directory, config)
+    write_run(path + '.tmp.npz', modelDF, config)
+    os.replace(path + '.tmp.npz', path)
+    with open(os.path.join(directory, 'index.jsonl'), 'a') as index:
+        index.write(json.dumps({'key': config_key(config), 'config': config}) + '\n')
+
+
+# Runs every configuration that has no saved results in directory yet, yielding (config, results DataFrame) as each
+# finishes. A failing configuration is reported and skipped, running the sweep again retries it
+def run_sweep(configs, directory, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    configs = [complete_config(config) for config in configs]
+    pending = list({config_key(config): config for config in configs
+                    if not os.path.exists(result_path(directory, config))}.values())
+    print(len(configs) - len(pending), 'of', len(configs), 'configurations already done')
+    if not pending:
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(pending))) as executor:
+        futures = {executor.submit(run_config, config): config for config in pending}
+        for future in as_completed(futures):
+            config = futures[future]
+            try:
+                modelDF = future.result()
+            except Exception as error:
+                print('configuration', config, 'failed:', repr(error))
+                continue
+            save_result(directory, config, modelDF)
+            yield config, modelDF
+
+
+# Loads every finished configuration of a sweep as (config, arrays), the arrays keyed like storage.read_run's
+def load_sweep(directory):
+    results = {}
+    with open(os.path.join(directory, 'index.jsonl')) as index:
+        for line in index:
+            entry = json.loads(line)
+            results[entry['key']] = entry['config']
+    return [(config, read_run(os.path.join(directory, key + '.npz'))[0]) for key, config in results.items()
+            if os.path.exists(os.path.join(directory, key + '.npz'))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run (or resume) a parameter sweep of PrivacyModel.')
+    parser.add_argument('spec', help='JSON file with either a grid {"parameter": [values]} or a list of configurations')
+    parser.add_argument('--output', required=True, help='directory the results of each configuration are saved to')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.spec) as file:
+        spec = json.load(file)
+    configs = spec if isinstance(spec, list) else expand_grid(spec)
+    for config, modelDF in run_sweep(configs, args.output, args.workers):
+        print('done', config)
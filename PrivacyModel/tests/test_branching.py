@@ -0,0 +1,25 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.EpsilonAgent import EpsilonAgent
+from branching import run_branches
+from model import PrivacyModel, finish_simulation
+from storage import run_arrays
+
+
+# A seed variant of a model with counter-based streams reseeds the streams, so branches with different seeds diverge
+# while an empty variant carries on exactly as the model would have
+def test_counter_rng_seed_variants_diverge():
+    model_inst = PrivacyModel(EpsilonAgent, 40, 8, 0.3, seed=5, counter_rng=True)
+    finish_simulation(model_inst, 10, {})
+    same, first, second = [run_arrays(branch)['happiness'] for branch in
+                           run_branches(model_inst, [{}, {'seed': 6}, {'seed': 7}], 30, workers=3)]
+    unbranched = run_arrays(finish_simulation(model_inst, 30, {}))['happiness']
+
+    assert np.array_equal(same, unbranched)
+    assert np.array_equal(first[:10], second[:10])
+    assert not np.array_equal(first[10:], second[10:])
+    assert not np.array_equal(first[10:], unbranched[10:])
@@ -0,0 +1,31 @@
+import http.client
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from service import JobService, make_server
+
+
+def post(server, body):
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request('POST', '/jobs', json.dumps(body), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+# Specs that are not a valid job are answered with 400 and nothing is queued
+def test_invalid_specs_are_rejected(tmp_path):
+    service = JobService(str(tmp_path), workers=1)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for spec in ({'sweep': 'abc'}, {'sweep': 3}, {'sweep': []}, {'run': {'agent': 'nobody'}}, ['run']):
+            status, body = post(server, spec)
+            assert status == 400 and 'error' in body
+        assert not service.jobs
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
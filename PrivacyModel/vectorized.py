@@ -0,0 +1,335 @@
+# Struct-of-arrays version of PrivacyModel, the whole population is stored as NumPy arrays and advanced with array
+# operations instead of one Mesa Agent object per agent, so populations of 10^5 - 10^6 agents can be simulated.
+#
+# Supports the selfish (BasicAgent), random (RandomAgent) and majority (MajorityAgent) policies.
+
+from bisect import bisect_left
+from collections import Counter
+import random
+
+from mesa import Model
+import numpy as np
+
+from agents import AgentConstants
+from collector import population_collector
+from graph import relationship_graph
+from mobility import PlaceDistribution, place_distribution
+from rng import CounterStreams
+from stats import PopulationStats
+
+# Policies that can be vectorized, keyed by the agent class (or its name) they reproduce
+POLICIES = {'BasicAgent': 'basic', 'RandomAgent': 'random', 'MajorityAgent': 'majority'}
+
+# Upper bounds of the uniform draw for each place in the agents' move(), place i is picked if p <= (i + 1) / 9
+MOVE_THRESHOLDS = [(i + 1) / 9 for i in range(8)]
+
+# Upper bounds of the uniform draw for each privacy type when the population is spread
+PRIVACY_THRESHOLDS = [0.455, 0.818]
+
+
+# External metric functions, same reporters as model.py but reading the population arrays, which the
+# ArrayDataCollector copies
+def happy_individual(model):
+    return model.happy
+
+
+def agent_privacy(model):
+    return model.privacyType
+
+
+def agent_action(model):
+    return model.currentAction
+
+
+def individual_reward(model):
+    return model.reward
+
+
+def average_happy(model):
+    return model.populationStats.mean
+
+
+def max_happy(model):
+    return model.populationStats.max
+
+
+def min_happy(model):
+    return model.populationStats.min
+
+
+def average_reward(model):
+    return model.reward.mean()
+
+
+def below_average(model):
+    return model.populationStats.countBelowMean()
+
+
+AGENT_REPORTERS = {"Individual_Happiness": (happy_individual, np.float64),
+                   "Agent_Privacy": (agent_privacy, np.int8),
+                   "Agent_Action": (agent_action, np.int8),
+                   "Individual_Reward": (individual_reward, np.float64)}
+MODEL_REPORTERS = {"Average_Happiness": (average_happy, np.float64),
+                   "Max_Happiness": (max_happy, np.float64),
+                   "Min_Happiness": (min_happy, np.float64),
+                   "Average_Reward": (average_reward, np.float64),
+                   "Below_Average": (below_average, np.int64)}
+
+
+# Privacy types and starting places of a population of N, drawn from the NumPy generator rng
+def initial_population(N, privacy_population, rng):
+    if privacy_population == -1:
+        privacy_type = np.searchsorted(PRIVACY_THRESHOLDS, rng.random(N), side='left').astype(np.int8)
+    else:
+        privacy_type = np.full(N, privacy_population, dtype=np.int8)
+    return privacy_type, rng.integers(0, 9, N).astype(np.int8)
+
+
+# Privacy types and starting places of the given agents (an array of unique_ids) from their counter-based draws, the
+# same as PrivacyModel's with counter_rng
+def counter_population(agents, privacy_population, streams):
+    if privacy_population == -1:
+        privacy_type = np.searchsorted(PRIVACY_THRESHOLDS, streams.uniforms('privacy', 0, agents),
+                                       side='left').astype(np.int8)
+    else:
+        privacy_type = np.full(len(agents), privacy_population, dtype=np.int8)
+    return privacy_type, (streams.uniforms('place', 0, agents) * 9).astype(np.int8)
+
+
+# Action each agent picks on its own given the (agents x actions) values of its place: the selfish (largest) one, or
+# for the random policy the one picked by the uniform draws p. Ties go to the first action like the if/elif chain in
+# the agents
+def own_actions(policy, values, p=None):
+    action = values.argmax(axis=1)
+    if policy == 'random':
+        chosen = (p > 1 / 3).astype(np.int64) + (p > 2 / 3)
+        action = (values == values[np.arange(len(values)), chosen][:, np.newaxis]).argmax(axis=1)
+    return action
+
+
+# Majority policy: follow an action chosen by more than half of the companions, if there is one. (owner[e],
+# companion_action[e]) are the agents and the actions of their companions
+def majority_actions(values, action, owner, companion_action, num_companions):
+    n = len(values)
+    votes = np.bincount(owner * 3 + companion_action, minlength=n * 3).reshape(n, 3)
+    majority = votes * 2 > num_companions[:, np.newaxis]
+    action = np.where(majority.any(axis=1), majority.argmax(axis=1), action)
+    return (values == values[np.arange(n), action][:, np.newaxis]).argmax(axis=1)
+
+
+# +5 for each companion taking the same action, -2 for each one that does not, scaled by number of companions
+def companion_rewards(owner, owner_action, companion_action, num_companions):
+    agreeing = np.bincount(owner, weights=owner_action == companion_action, minlength=len(num_companions))
+    reward = 5 * agreeing - 2 * (num_companions - agreeing)
+    np.divide(reward * 2, num_companions, out=reward, where=num_companions > 0)
+    return reward
+
+
+def resolve_policy(agent_model):
+    name = agent_model if isinstance(agent_model, str) else agent_model.__name__
+    if name in POLICIES.values():
+        return name
+    if name not in POLICIES:
+        raise ValueError('VectorizedPrivacyModel cannot run ' + name + ', supported policies are ' +
+                         ', '.join(POLICIES))
+    return POLICIES[name]
+
+
+class VectorizedPrivacyModel(Model):
+    """A model with some number of agents, stored as arrays.
+
+    Takes the same arguments as PrivacyModel, with agent_model being BasicAgent, RandomAgent or MajorityAgent (or
+    'basic', 'random', 'majority').
+
+    By default every step is synchronous: all agents value their place and choose an action at the same time, look at
+    the actions their companions chose in that same step, then all move at once, with randomness drawn from a NumPy
+    generator seeded with seed.
+
+    With equivalence=True the step instead mirrors PrivacyModel exactly: agents are activated one at a time in the
+    order RandomActivation would shuffle them, see the partially updated population, move straight after deciding and
+    draw from the same random.Random stream. For the same agent_model, N, num_of_friends, rewire and seed this gives the
+    same positions, actions, rewards and happiness as PrivacyModel at every step, at the cost of a Python loop over
+    the agents.
+
+    With counter_rng=True every agent's draws are keyed by (seed, agent, step, purpose) (see rng.py) instead of drawn
+    in turn. The equivalence step then matches PrivacyModel(counter_rng=True), and the synchronous step matches
+    ShardedPrivacyModel(counter_rng=True) whatever the number of shards.
+    """
+
+    def __init__(self, agent_model, N, num_of_friends=6, rewire=0.1, preferences=None, seed=102,
+                 privacy_population=2, equivalence=False, mobility=None, relationship=None, counter_rng=False,
+                 collect=None, burn_in=0):
+        self.num_agents = N
+        self.policy = resolve_policy(agent_model)
+        self.equivalence = equivalence
+        self.running = True
+        # Using random seeds for replicating results (100, 101, 102)
+        self.seed = seed
+        # mesa's Model keeps random on the class, where every model made (or unpickled) replaces it, so each model
+        # gets its own generator, which is also saved with the model when it is checkpointed
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        # Counter-based draws instead, see PrivacyModel
+        self.streams = CounterStreams(seed) if counter_rng else None
+
+        # Setting privacy type of all agents (-1 for spread, 0-2 for fixed)
+        self.privacyPopulation = privacy_population
+
+        # Distribution of the places agents move to, see mobility.py. None is uniform, with the equivalence step drawing
+        # it exactly like the agents' move()
+        self.mobility = place_distribution(mobility)
+        self.sampler = self.mobility if self.mobility is not None else PlaceDistribution.uniform()
+
+        if preferences is None:
+            self.actionValues = AgentConstants.action_values
+        else:
+            self.actionValues = AgentConstants.build_action_values(preferences)
+
+        # Initialise relationship between agents as a Watts-Strogatz graph, the same CSR graph PrivacyModel builds for
+        # the seed (or the given one). Neighbours are in ascending order, the order agents see their companions in
+        self.relationship = relationship_graph(relationship, N, num_of_friends, rewire, seed)
+        self.friendsPtr, self.friends = self.relationship.indptr, self.relationship.indices
+        # Owner of each entry in self.friends, so every (agent, friend) pair can be compared at once
+        self.friendsOf = self.relationship.owners()
+
+        # For keeping track of time for agent's history
+        self.timeStep = 0
+
+        # Create agents
+        self.privacyType = np.empty(N, dtype=np.int8)
+        self.pos = np.empty(N, dtype=np.int8)
+        if counter_rng:
+            self.privacyType[:], self.pos[:] = counter_population(np.arange(N), self.privacyPopulation, self.streams)
+        elif equivalence:
+            # Same draws, in the same order, as PrivacyModel's agent constructors and initial placement
+            for i in range(N):
+                self.privacyType[i] = self.initialPrivacyType(self.random.uniform(0, 1)
+                                                              if self.privacyPopulation == -1 else None)
+                self.pos[i] = self.random.randint(0, 8)
+        else:
+            self.privacyType[:], self.pos[:] = initial_population(N, self.privacyPopulation, self.rng)
+        self.currentAction = np.full(N, AgentConstants.SHARE_NO, dtype=np.int8)
+        # The happiness array is shared with the population statistics, which are refreshed after every step
+        self.populationStats = PopulationStats(N)
+        self.happy = self.populationStats.values
+        self.reward = np.zeros(N)
+
+        # Collected like PrivacyModel's, see collector.py
+        self.datacollector = population_collector(N, AGENT_REPORTERS, MODEL_REPORTERS, collect, burn_in)
+
+    def initialPrivacyType(self, p):
+        if p is None:
+            return self.privacyPopulation
+        if p <= PRIVACY_THRESHOLDS[0]:
+            return AgentConstants.CAUTIOUS
+        elif p <= PRIVACY_THRESHOLDS[1]:
+            return AgentConstants.CONSCIENTIOUS
+        return AgentConstants.CASUAL
+
+    def step(self):
+        self.datacollector.collect(self)
+        '''Advance the model by one step.'''
+        if self.equivalence:
+            self.sequentialStep()
+        else:
+            self.synchronousStep()
+        self.populationStats.refresh()
+        self.timeStep += 1
+
+    # Uniform draws of every agent for purpose this step, from the model's generator or its counter-based streams
+    def draws(self, purpose):
+        if self.streams is None:
+            return self.rng.random(self.num_agents)
+        return self.streams.uniforms(purpose, self.timeStep, np.arange(self.num_agents))
+
+    # All agents decide at once on the positions at the start of the step, then all move
+    def synchronousStep(self):
+        n = self.num_agents
+        values = self.actionValues[self.privacyType, self.pos]
+        action = own_actions(self.policy, values, self.draws('action') if self.policy == 'random' else None)
+
+        # Friends that are at the same place as the agent
+        together = self.pos[self.friendsOf] == self.pos[self.friends]
+        owner = self.friendsOf[together]
+        companions = self.friends[together]
+        num_companions = np.bincount(owner, minlength=n)
+
+        if self.policy == 'majority':
+            action = majority_actions(values, action, owner, action[companions], num_companions)
+        reward = companion_rewards(owner, action[owner], action[companions], num_companions)
+
+        self.currentAction[:] = action
+        self.reward[:] = reward
+        self.happy[:] = values[np.arange(n), action] + reward
+        self.pos[:] = self.sampler.places(self.privacyType, self.draws('move'))
+
+    # Agents are activated one after another exactly like RandomActivation runs PrivacyModel's agents
+    def sequentialStep(self):
+        if self.streams is None:
+            agent_keys = list(range(self.num_agents))
+            self.random.shuffle(agent_keys)
+            action_draws = move_draws = None
+        else:
+            agent_keys = self.streams.order(self.timeStep, self.num_agents).tolist()
+            action_draws = self.draws('action').tolist()
+            move_draws = self.draws('move').tolist()
+
+        values = self.actionValues.tolist()
+        privacy_type = self.privacyType.tolist()
+        pos = self.pos.tolist()
+        current_action = self.currentAction.tolist()
+        happy = self.happy.tolist()
+        reward_list = self.reward.tolist()
+        friends_ptr = self.friendsPtr.tolist()
+        friends = self.friends.tolist()
+
+        for i in agent_keys:
+            place = pos[i]
+            no_value, friends_value, public_value = action_values = values[privacy_type[i]][place]
+            selfish_value = max(action_values)
+
+            if self.policy == 'random':
+                p = self.random.uniform(0, 1) if action_draws is None else action_draws[i]
+                if p <= (1 / 3):
+                    best_action = no_value
+                elif p <= (2 / 3):
+                    best_action = friends_value
+                else:
+                    best_action = public_value
+            else:
+                best_action = selfish_value
+            current_action[i] = action_values.index(best_action)
+
+            companions = [j for j in friends[friends_ptr[i]:friends_ptr[i + 1]] if pos[j] == place]
+
+            if self.policy == 'majority':
+                for (key, value) in Counter(current_action[j] for j in companions).items():
+                    if value > len(companions) / 2:
+                        current_action[i] = key
+                        best_action = action_values[key]
+                        break
+
+            reward = 0
+            for j in companions:
+                if current_action[j] == current_action[i]:
+                    reward += 5
+                else:
+                    reward -= 2
+            if reward != 0:
+                reward = (reward * 2) / len(companions)
+
+            if self.policy == 'majority':
+                current_action[i] = [value + reward for value in action_values].index(best_action + reward)
+
+            reward_list[i] = reward
+            happy[i] = best_action + reward
+            p = self.random.uniform(0, 1) if move_draws is None else move_draws[i]
+            if self.mobility is None:
+                pos[i] = bisect_left(MOVE_THRESHOLDS, p)
+            else:
+                pos[i] = self.mobility.place(privacy_type[i], p)
+
+        self.pos[:] = pos
+        self.currentAction[:] = current_action
+        self.happy[:] = happy
+        self.reward[:] = reward_list